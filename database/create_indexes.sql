@@ -1,20 +1,16 @@
 ------------------------------------------------------------------------------------------------------------------------
 -- Indexes pour les skyplot de cs
+-- (pas de "concurrently" sur une table partitionnée, les index sont créés sur chaque partition).
+-- Les autres skyplots utilisent la clé primaire (station_id, date, ...).
 
-create index concurrently "speed-skyplot-cs1"
-on skyplot(station_id)
+create index "speed-skyplot-cs1"
+on skyplot(station_id, date)
 where cs1;
 
-create index concurrently "speed-skyplot-cs2"
-on skyplot(station_id)
+create index "speed-skyplot-cs2"
+on skyplot(station_id, date)
 where cs2;
 
-create index concurrently "speed-skyplot-cs5"
-on skyplot(station_id)
+create index "speed-skyplot-cs5"
+on skyplot(station_id, date)
 where cs5;
-
-------------------------------------------------------------------------------------------------------------------------
--- Indexes pour les autres skyplots
-
-create index concurrently "speed-skyplot-station-date"
-on skyplot(station_id, date_id);
@@ -1,5 +1,3 @@
 drop index "speed-skyplot-cs1";
 drop index "speed-skyplot-cs2";
 drop index "speed-skyplot-cs5";
-
-drop index "speed-skyplot-station-date";
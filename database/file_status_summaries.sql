@@ -0,0 +1,63 @@
+------------------------------------------------------------------------------------------------------------------------
+-- Migration ajoutant les résumés par semaine et par mois de la table file_status (voir schema.sql), remplis à partir
+-- des données existantes. Ils sont ensuite tenus à jour par la commande `xtr2database file_status`.
+
+begin;
+
+-- Résumés de file_status par station et par semaine (à partir du lundi) ou par mois, tenus à jour par la commande
+-- `xtr2database file_status` : nombre de jours ayant des fichiers, un Rinex 3, un xtr et les deux.
+create table file_status_weekly (
+    station_id smallint not null
+        constraint file_status_weekly_station_id_fk references station
+        on delete cascade,
+    date date not null,
+    days smallint not null,
+    rinex3_days smallint not null,
+    xtr_days smallint not null,
+    complete_days smallint not null,
+    constraint file_status_weekly_pk primary key (station_id, date)
+);
+
+create table file_status_monthly (
+    station_id smallint not null
+        constraint file_status_monthly_station_id_fk references station
+        on delete cascade,
+    date date not null,
+    days smallint not null,
+    rinex3_days smallint not null,
+    xtr_days smallint not null,
+    complete_days smallint not null,
+    constraint file_status_monthly_pk primary key (station_id, date)
+);
+
+insert into file_status_weekly
+select
+    station_id,
+    date_trunc('week', date)::date as week,
+    count(*),
+    count(*) filter (where has_rinex3),
+    count(*) filter (where has_xtr),
+    count(*) filter (where has_rinex3 and has_xtr)
+from file_status
+group by station_id, week;
+
+insert into file_status_monthly
+select
+    station_id,
+    date_trunc('month', date)::date as month,
+    count(*),
+    count(*) filter (where has_rinex3),
+    count(*) filter (where has_xtr),
+    count(*) filter (where has_rinex3 and has_xtr)
+from file_status
+group by station_id, month;
+
+-- Lecture des nouvelles tables par l'utilisateur de Grafana (voir docker/init_postgres.sql)
+do $$
+begin
+    if exists (select from pg_roles where rolname = 'grafana_reader') then
+        grant select on file_status_weekly, file_status_monthly to grafana_reader;
+    end if;
+end $$;
+
+commit;
@@ -0,0 +1,43 @@
+------------------------------------------------------------------------------------------------------------------------
+-- Migration ajoutant les clés primaires des tables de séries temporelles (voir schema.sql), après
+-- narrow_fact_tables.sql. Les doublons laissés par des réimportations sont supprimés (une seule valeur est gardée).
+--
+-- A executer hors importation.
+
+begin;
+
+delete from sig2noise where station_id is null or constellation_id is null or observation_type_id is null;
+delete from sig2noise a using sig2noise b
+where a.ctid < b.ctid
+    and a.station_id = b.station_id
+    and a.date = b.date
+    and a.constellation_id = b.constellation_id
+    and a.observation_type_id = b.observation_type_id;
+alter table sig2noise add constraint snr_pk primary key (station_id, date, constellation_id, observation_type_id);
+
+delete from multipath where station_id is null or constellation_id is null or observation_type_id is null;
+delete from multipath a using multipath b
+where a.ctid < b.ctid
+    and a.station_id = b.station_id
+    and a.date = b.date
+    and a.constellation_id = b.constellation_id
+    and a.observation_type_id = b.observation_type_id;
+alter table multipath add constraint multipath_pk primary key (station_id, date, constellation_id, observation_type_id);
+
+delete from observation_cs where station_id is null or constellation_id is null;
+delete from observation_cs a using observation_cs b
+where a.ctid < b.ctid
+    and a.station_id = b.station_id
+    and a.date = b.date
+    and a.constellation_id = b.constellation_id;
+alter table observation_cs add constraint observation_cs_pk primary key (station_id, date, constellation_id);
+
+delete from satellite_cs where station_id is null or constellation_id is null;
+delete from satellite_cs a using satellite_cs b
+where a.ctid < b.ctid
+    and a.station_id = b.station_id
+    and a.date = b.date
+    and a.constellation_id = b.constellation_id;
+alter table satellite_cs add constraint satellite_cs_pk primary key (station_id, date, constellation_id);
+
+commit;
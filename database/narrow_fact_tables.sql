@@ -0,0 +1,116 @@
+------------------------------------------------------------------------------------------------------------------------
+-- Migration vers les tables de données sans identifiant (voir schema.sql) : les tables des séries temporelles perdent
+-- leur colonne id, et la table skyplot est identifiée par sa clé naturelle, avec l'heure en secondes depuis le début du
+-- jour plutôt qu'un horodatage complet.
+--
+-- A executer hors importation, sur une table skyplot déjà partitionnée (voir partition_skyplot.sql), après
+-- drop_indexes.sql, puis lancer create_indexes.sql.
+
+begin;
+
+alter table sig2noise drop column id;
+alter table multipath drop column id;
+alter table observation_cs drop column id;
+alter table satellite_cs drop column id;
+
+-- L'ancienne table et ses partitions sont renommées pour libérer les noms
+alter table skyplot rename to skyplot_old;
+alter table skyplot_old rename constraint skyplot_pk to skyplot_old_pk;
+
+do $$
+declare
+    partition record;
+begin
+    for partition in
+        select c.relname as name
+        from pg_inherits i
+        inner join pg_class c on c.oid = i.inhrelid
+        where i.inhparent = 'skyplot_old'::regclass
+            or i.inhparent in (select inhrelid from pg_inherits where inhparent = 'skyplot_old'::regclass)
+    loop
+        execute format('alter table %I rename to %I', partition.name, replace(partition.name, 'skyplot_', 'skyplot_old_'));
+    end loop;
+end $$;
+
+create table skyplot (
+    date date not null,
+    epoch integer not null,
+    station_id smallint not null
+        constraint skyplot_station_id_fk references station
+        on delete cascade,
+    constellation_id smallint not null
+        constraint skyplot_constellation_id_fk references constellation
+        on delete cascade,
+    satellite smallint not null,
+    elevation smallint not null,
+    azimut smallint not null,
+    mp1 smallint,
+    mp2 smallint,
+    mp5 smallint,
+    sig2noise1 smallint,
+    sig2noise2 smallint,
+    sig2noise5 smallint,
+    cs1 boolean not null default false,
+    cs2 boolean not null default false,
+    cs5 boolean not null default false,
+    constraint skyplot_pk primary key (station_id, date, constellation_id, satellite, epoch)
+) partition by range (date);
+
+-- Les mêmes partitions mensuelles, avec le même découpage par station
+do $$
+declare
+    partition record;
+    name text;
+    remainder integer;
+begin
+    for partition in
+        select c.oid, c.relname, (select count(*) from pg_inherits sub where sub.inhparent = c.oid) as station_partitions
+        from pg_inherits i
+        inner join pg_class c on c.oid = i.inhrelid
+        where i.inhparent = 'skyplot_old'::regclass
+    loop
+        name := replace(partition.relname, 'skyplot_old_', 'skyplot_');
+
+        execute format(
+            'create table %I partition of skyplot for values from (%L) to (%L)%s',
+            name,
+            to_date(substr(name, 10), 'YYYY"m"MM'),
+            to_date(substr(name, 10), 'YYYY"m"MM') + interval '1 month',
+            case when partition.station_partitions > 0 then ' partition by hash (station_id)' else '' end
+        );
+
+        for remainder in 0 .. partition.station_partitions - 1 loop
+            execute format(
+                'create table %I partition of %I for values with (modulus %s, remainder %s)',
+                name || '_s' || remainder, name, partition.station_partitions, remainder
+            );
+        end loop;
+    end loop;
+end $$;
+
+insert into skyplot (
+    date, epoch, station_id, constellation_id,
+    satellite, elevation, azimut,
+    mp1, mp2, mp5,
+    sig2noise1, sig2noise2, sig2noise5,
+    cs1, cs2, cs5
+)
+select
+    datetime::date, extract(epoch from datetime::time)::integer, station_id, constellation_id,
+    satellite, elevation, azimut,
+    mp1, mp2, mp5,
+    sig2noise1, sig2noise2, sig2noise5,
+    cs1, cs2, cs5
+from skyplot_old;
+
+drop table skyplot_old;
+
+-- La table skyplot recréée n'a plus les droits de lecture de l'utilisateur de Grafana (voir docker/init_postgres.sql)
+do $$
+begin
+    if exists (select from pg_roles where rolname = 'grafana_reader') then
+        grant select on skyplot to grafana_reader;
+    end if;
+end $$;
+
+commit;
@@ -0,0 +1,82 @@
+------------------------------------------------------------------------------------------------------------------------
+-- Migration d'une table skyplot non partitionnée vers une table partitionnée par mois (voir schema.sql).
+--
+-- A executer hors importation, après drop_indexes.sql, puis lancer create_indexes.sql. Les partitions des
+-- importations suivantes sont créées par xtr2database.
+
+begin;
+
+alter table skyplot rename to skyplot_old;
+alter table skyplot_old rename constraint skyplot_pk to skyplot_old_pk;
+alter table skyplot_old rename constraint skyplot_datetime_station_id_constellation_id_satellite_key
+    to skyplot_old_datetime_station_id_constellation_id_satellite_key;
+alter sequence skyplot_id_seq rename to skyplot_old_id_seq;
+
+create table skyplot (
+    id bigserial,
+    datetime timestamp not null,
+    date_id integer
+        constraint skyplot_date_id_fk references skyplot_date,
+    station_id smallint
+        constraint skyplot_station_id_fk references station
+        on delete cascade,
+    constellation_id smallint
+        constraint skyplot_constellation_id_fk references constellation
+        on delete cascade,
+    satellite smallint not null,
+    elevation smallint not null,
+    azimut smallint not null,
+    mp1 smallint,
+    mp2 smallint,
+    mp5 smallint,
+    sig2noise1 smallint,
+    sig2noise2 smallint,
+    sig2noise5 smallint,
+    cs1 boolean not null default false,
+    cs2 boolean not null default false,
+    cs5 boolean not null default false,
+    constraint skyplot_pk primary key (id, datetime),
+    unique (datetime, station_id, constellation_id, satellite)
+) partition by range (datetime);
+
+-- Une partition par mois de données existantes
+do $$
+declare
+    month date;
+begin
+    for month in
+        select distinct date_trunc('month', datetime)::date from skyplot_old
+    loop
+        execute format(
+            'create table %I partition of skyplot for values from (%L) to (%L)',
+            to_char(month, '"skyplot_y"YYYY"m"MM'), month, month + interval '1 month'
+        );
+    end loop;
+end $$;
+
+insert into skyplot (
+    datetime, date_id, station_id, constellation_id,
+    satellite, elevation, azimut,
+    mp1, mp2, mp5,
+    sig2noise1, sig2noise2, sig2noise5,
+    cs1, cs2, cs5
+)
+select
+    datetime, date_id, station_id, constellation_id,
+    satellite, elevation, azimut,
+    mp1, mp2, mp5,
+    sig2noise1, sig2noise2, sig2noise5,
+    cs1, cs2, cs5
+from skyplot_old;
+
+drop table skyplot_old;
+
+-- La table skyplot recréée n'a plus les droits de lecture de l'utilisateur de Grafana (voir docker/init_postgres.sql)
+do $$
+begin
+    if exists (select from pg_roles where rolname = 'grafana_reader') then
+        grant select on skyplot to grafana_reader;
+    end if;
+end $$;
+
+commit;
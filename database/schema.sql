@@ -46,59 +46,61 @@ create table inserted_file (
 
 ------------------------------------------------------------------------------------------------------------------------
 -- Tables de séries temporelles
+-- Une seule valeur par jour et par station (et constellation, type d'observation) : les réimportations remplacent
+-- les valeurs existantes.
 
 create table sig2noise (
-    id bigserial constraint snr_pk primary key,
     date date not null,
-    station_id smallint
+    station_id smallint not null
         constraint snr_station_id_fk references station
         on delete cascade,
-    constellation_id smallint
+    constellation_id smallint not null
         constraint snr_constellation_id_fk references constellation
         on delete cascade,
-    observation_type_id smallint
+    observation_type_id smallint not null
         constraint snr_observation_type_id_fk references observation_type
         on delete cascade,
-    value real not null
+    value real not null,
+    constraint snr_pk primary key (station_id, date, constellation_id, observation_type_id)
 );
 
 create table multipath (
-    id bigserial constraint multipath_pk primary key,
     date date not null,
-    station_id smallint
+    station_id smallint not null
         constraint multipath_station_id_fk references station
         on delete cascade,
-    constellation_id smallint
+    constellation_id smallint not null
         constraint multipath_constellation_id_fk references constellation
         on delete cascade,
-    observation_type_id smallint
+    observation_type_id smallint not null
         constraint multipath_observation_type_id_fk references observation_type
         on delete cascade,
-    value real not null
+    value real not null,
+    constraint multipath_pk primary key (station_id, date, constellation_id, observation_type_id)
 );
 
 create table observation_cs (
-    id bigserial constraint observation_cs_pk primary key,
     date date not null,
-    station_id smallint
+    station_id smallint not null
         constraint observation_cs_station_id_fk references station
         on delete cascade,
-    constellation_id smallint
+    constellation_id smallint not null
         constraint observation_cs_constellation_id_fk references constellation
         on delete cascade,
-    value real not null
+    value real not null,
+    constraint observation_cs_pk primary key (station_id, date, constellation_id)
 );
 
 create table satellite_cs (
-    id bigserial constraint satellite_cs_pk primary key,
     date date not null,
-    station_id smallint
+    station_id smallint not null
         constraint satellite_cs_station_id_fk references station
         on delete cascade,
-    constellation_id smallint
+    constellation_id smallint not null
         constraint satellite_cs_constellation_id_fk references constellation
         on delete cascade,
-    value real not null
+    value real not null,
+    constraint satellite_cs_pk primary key (station_id, date, constellation_id)
 );
 
 ------------------------------------------------------------------------------------------------------------------------
@@ -141,15 +143,16 @@ create table skyplot_used_band (
     unique (date_id, station_id, constellation_id)
 );
 
+-- Partitionnée par mois, les partitions sont créées par xtr2database lors des importations
+-- (voir la commande `xtr2database partitions`). Les rangées sont identifiées par leur clé
+-- naturelle, l'heure étant stockée en secondes depuis le début du jour (`epoch`).
 create table skyplot (
-    id bigserial constraint skyplot_pk primary key,
-    datetime timestamp not null,
-    date_id integer
-        constraint skyplot_date_id_fk references skyplot_date,
-    station_id smallint
+    date date not null,
+    epoch integer not null,
+    station_id smallint not null
         constraint skyplot_station_id_fk references station
         on delete cascade,
-    constellation_id smallint
+    constellation_id smallint not null
         constraint skyplot_constellation_id_fk references constellation
         on delete cascade,
     satellite smallint not null,
@@ -164,7 +167,32 @@ create table skyplot (
     cs1 boolean not null default false,
     cs2 boolean not null default false,
     cs5 boolean not null default false,
-    unique (datetime, station_id, constellation_id, satellite)
+    constraint skyplot_pk primary key (station_id, date, constellation_id, satellite, epoch)
+) partition by range (date);
+
+-- Skyplots agrégés par jour sur une grille élévation/azimut (cellules de 5° par 10°, identifiées par leurs bornes
+-- basses), remplie par xtr2database avec la métrique `skyplot_rollup`.
+create table skyplot_rollup (
+    date date not null,
+    station_id smallint not null
+        constraint skyplot_rollup_station_id_fk references station
+        on delete cascade,
+    constellation_id smallint not null
+        constraint skyplot_rollup_constellation_id_fk references constellation
+        on delete cascade,
+    elevation smallint not null,
+    azimut smallint not null,
+    points integer not null,
+    mp1 real,
+    mp2 real,
+    mp5 real,
+    sig2noise1 real,
+    sig2noise2 real,
+    sig2noise5 real,
+    cs1 integer not null default 0,
+    cs2 integer not null default 0,
+    cs5 integer not null default 0,
+    constraint skyplot_rollup_pk primary key (station_id, date, constellation_id, elevation, azimut)
 );
 
 ------------------------------------------------------------------------------------------------------------------------
@@ -179,3 +207,29 @@ create table file_status (
     has_xtr boolean not null default false,
     unique (date, station_id)
 );
+
+-- Résumés de file_status par station et par semaine (à partir du lundi) ou par mois, tenus à jour par la commande
+-- `xtr2database file_status` : nombre de jours ayant des fichiers, un Rinex 3, un xtr et les deux.
+create table file_status_weekly (
+    station_id smallint not null
+        constraint file_status_weekly_station_id_fk references station
+        on delete cascade,
+    date date not null,
+    days smallint not null,
+    rinex3_days smallint not null,
+    xtr_days smallint not null,
+    complete_days smallint not null,
+    constraint file_status_weekly_pk primary key (station_id, date)
+);
+
+create table file_status_monthly (
+    station_id smallint not null
+        constraint file_status_monthly_station_id_fk references station
+        on delete cascade,
+    date date not null,
+    days smallint not null,
+    rinex3_days smallint not null,
+    xtr_days smallint not null,
+    complete_days smallint not null,
+    constraint file_status_monthly_pk primary key (station_id, date)
+);
@@ -0,0 +1,60 @@
+------------------------------------------------------------------------------------------------------------------------
+-- Migration ajoutant la table des skyplots agrégés (voir schema.sql), remplie à partir des points déjà présents dans la
+-- table skyplot. Les cellules font 5° d'élévation par 10° d'azimut, comme dans xtr2database.
+--
+-- A executer hors importation, après narrow_fact_tables.sql.
+
+begin;
+
+create table skyplot_rollup (
+    date date not null,
+    station_id smallint not null
+        constraint skyplot_rollup_station_id_fk references station
+        on delete cascade,
+    constellation_id smallint not null
+        constraint skyplot_rollup_constellation_id_fk references constellation
+        on delete cascade,
+    elevation smallint not null,
+    azimut smallint not null,
+    points integer not null,
+    mp1 real,
+    mp2 real,
+    mp5 real,
+    sig2noise1 real,
+    sig2noise2 real,
+    sig2noise5 real,
+    cs1 integer not null default 0,
+    cs2 integer not null default 0,
+    cs5 integer not null default 0,
+    constraint skyplot_rollup_pk primary key (station_id, date, constellation_id, elevation, azimut)
+);
+
+insert into skyplot_rollup
+select
+    date,
+    station_id,
+    constellation_id,
+    floor(elevation / 5.0) * 5 as cell_elevation,
+    floor(((azimut % 360 + 360) % 360) / 10.0) * 10 as cell_azimut,
+    count(*),
+    avg(mp1),
+    avg(mp2),
+    avg(mp5),
+    avg(sig2noise1),
+    avg(sig2noise2),
+    avg(sig2noise5),
+    count(*) filter (where cs1),
+    count(*) filter (where cs2),
+    count(*) filter (where cs5)
+from skyplot
+group by station_id, date, constellation_id, cell_elevation, cell_azimut;
+
+-- Lecture de la nouvelle table par l'utilisateur de Grafana (voir docker/init_postgres.sql)
+do $$
+begin
+    if exists (select from pg_roles where rolname = 'grafana_reader') then
+        grant select on skyplot_rollup to grafana_reader;
+    end if;
+end $$;
+
+commit;
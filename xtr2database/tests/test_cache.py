@@ -0,0 +1,84 @@
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from xtr2database.cache import ParseCache
+from xtr2database.xtr_import import get_file_data, get_station_data
+
+XTR_FILE = Path(__file__).parent / "data" / "ADER00FRA-2023-01-02.xtr"
+METRICS = ["sig2noise", "skyplot"]
+
+
+@pytest.fixture
+def xtr_file(tmp_path):
+    dest = tmp_path / "xtr" / XTR_FILE.name
+    dest.parent.mkdir()
+    shutil.copy(XTR_FILE, dest)
+    return str(dest)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ParseCache(tmp_path / "cache")
+
+
+def test_cache_roundtrip(cache, xtr_file):
+    assert cache.get(xtr_file, METRICS) is None
+
+    data = get_file_data(xtr_file, metrics=METRICS)
+    cache.put(xtr_file, METRICS, data)
+
+    cached = cache.get(xtr_file, METRICS)
+    assert cached[0] == data[0]
+    assert list(cached[1]["GPS"]) == list(data[1]["GPS"])
+    assert cached[2:] == data[2:]
+
+    # les autres métriques ne sont pas dans le cache
+    assert cache.get(xtr_file, ["sig2noise"]) is None
+
+
+def test_cache_invalidated_on_change(cache, xtr_file):
+    cache.put(xtr_file, METRICS, get_file_data(xtr_file, metrics=METRICS))
+
+    with open(xtr_file, "a") as f:
+        f.write("\n")
+
+    assert cache.get(xtr_file, METRICS) is None
+
+
+def test_station_data_from_cache(cache, xtr_file):
+    expected = get_station_data([xtr_file], metrics=METRICS)
+    get_station_data([xtr_file], metrics=METRICS, cache=cache)
+
+    # le fichier n'est plus lu si il est dans le cache : on le rend illisible
+    # sans changer sa taille ni sa date de modification
+    stat = os.stat(xtr_file)
+    with open(xtr_file, "r+") as f:
+        f.write("x" * stat.st_size)
+    os.utime(xtr_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    cached = get_station_data([xtr_file], metrics=METRICS, cache=cache)
+
+    assert cached[0] == expected[0]
+    assert cached[2:] == expected[2:]
+
+
+def test_cache_prune(cache, xtr_file, tmp_path):
+    files = []
+    for i in range(3):
+        path = tmp_path / "xtr" / f"ADER00FRA-2023-01-0{i + 3}.xtr"
+        shutil.copy(xtr_file, path)
+        cache.put(str(path), METRICS, get_file_data(str(path), metrics=METRICS))
+        files.append(str(path))
+
+    size = cache.size()
+    assert size > 0
+
+    removed, freed = cache.prune(size - 1)
+    assert removed == 1
+    assert cache.size() == size - freed
+
+    assert cache.clear()[0] == 2
+    assert cache.size() == 0
@@ -0,0 +1,115 @@
+from collections import defaultdict
+from datetime import date
+
+import pytest
+
+from xtr2database.database import DatabaseFetcher, clear_tables
+
+
+class FakeCursor:
+    """
+    Curseur qui renvoie les rangées données pour chaque requête, dans l'ordre.
+    """
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.queries = []
+        self.rows = []
+
+    def execute(self, query, params=None):
+        self.queries.append((str(query), params))
+        self.rows = self.results.pop(0) if self.results else []
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(DatabaseFetcher, "_database_fetch_cache", defaultdict(dict))
+    monkeypatch.setattr(DatabaseFetcher, "_stations_without_coords", set())
+
+
+def test_preload():
+    cur = FakeCursor(
+        [{"id": 1, "key": "RENAG"}],
+        [{"id": 1, "key": "GPS"}, {"id": 2, "key": "GAL"}],
+        [{"id": 1, "key": "GPS"}],
+        [{"id": 7, "key": date(2023, 1, 2)}],
+        [{"id": 3, "network_id": 1, "fullname": "ADER00FRA", "lat": 42.8}],
+    )
+    fetcher = DatabaseFetcher()
+    fetcher.preload(cur)
+
+    # une constellation et un type d'observation peuvent avoir le même nom
+    assert fetcher.get_constellation_id(cur, "GPS") == 1
+    assert fetcher.get_observation_id(cur, "GPS") == 1
+    assert fetcher.get_ids(cur, "constellation", ["GAL", "GPS"]) == {"GPS": 1, "GAL": 2}
+    assert fetcher.get_ids(cur, "skyplot_date", [date(2023, 1, 2)])[date(2023, 1, 2)] == 7
+    assert DatabaseFetcher._database_fetch_cache["station"] == {(1, "ADER00FRA"): 3}
+
+    # tout vient du cache
+    assert len(cur.queries) == 5
+
+
+def test_get_ids_creates_missing():
+    cur = FakeCursor(
+        [{"id": 5, "key": "1X"}],  # insertion, 1C existait déjà
+        [{"id": 4, "key": "1C"}],  # récupération des autres
+    )
+    fetcher = DatabaseFetcher()
+
+    ids = fetcher.get_ids(cur, "observation_type", ["1X", "1C", "1X"])
+    assert ids["1C"] == 4
+    assert ids["1X"] == 5
+
+    insert, select = cur.queries
+    assert "insert into" in insert[0]
+    assert insert[1] == (["1C", "1X"],)
+    assert select[1] == (["1C"],)
+
+    # une seule requête quand tout est créé
+    cur = FakeCursor([{"id": 6, "key": "GPS"}])
+    assert fetcher.get_ids(cur, "constellation", ["GPS"]) == {"GPS": 6}
+    assert len(cur.queries) == 1
+
+
+def test_get_station_ids():
+    cur = FakeCursor(
+        [{"id": 3, "fullname": "ADER00FRA", "lat": 42.8}, {"id": 4, "fullname": "AGDE00FRA", "lat": None}],
+    )
+    fetcher = DatabaseFetcher()
+
+    station_ids = fetcher.get_station_ids(cur, 1, {"ADER00FRA": (42.8, 0.4), "AGDE00FRA": (None, None)})
+    assert station_ids == {"ADER00FRA": 3, "AGDE00FRA": 4}
+
+    query, params = cur.queries[0]
+    assert params["names"] == ["ADER00FRA", "AGDE00FRA"]
+    assert params["lats"] == [42.8, None]
+
+    # en cache, sauf pour ajouter des coordonées à une station qui n'en a pas
+    assert fetcher.get_station_id(cur, "ADER00FRA", 1, 42.8, 0.4) == 3
+    assert fetcher.get_station_id(cur, "AGDE00FRA", 1) == 4
+    assert len(cur.queries) == 1
+
+    cur = FakeCursor([{"id": 4, "fullname": "AGDE00FRA", "lat": 43.3}])
+    assert fetcher.get_station_id(cur, "AGDE00FRA", 1, 43.3, 3.5) == 4
+    assert fetcher.get_station_id(cur, "AGDE00FRA", 1, 43.3, 3.5) == 4
+    assert len(cur.queries) == 1
+
+
+@pytest.mark.parametrize("has_rollup", [True, False])
+def test_clear_tables_optional_rollup(has_rollup):
+    # un seul réseau : tout est vidé d'un coup
+    cur = FakeCursor([{"res": False, "has_rollup": has_rollup}])
+    clear_tables(cur, "RENAG")
+    assert len(cur.queries) == 2
+    assert ("skyplot_rollup" in cur.queries[1][0]) == has_rollup
+
+    # plusieurs réseaux : suppression réseau par réseau
+    cur = FakeCursor([{"res": True, "has_rollup": has_rollup}])
+    clear_tables(cur, "RENAG")
+    assert any("skyplot_rollup" in query for query, _ in cur.queries[1:]) == has_rollup
@@ -6,7 +6,7 @@ from textwrap import dedent
 
 import pytest
 
-from xtr2database.extractors import get_xtr_file_date, get_station_coords, get_xtr_station_id
+from xtr2database.extractors import get_rinex3_file_date, get_xtr_file_date, get_station_coords, get_xtr_station_id
 
 
 @pytest.mark.parametrize(
@@ -28,6 +28,25 @@ def test_get_file_date_bad_arguments(file_stem):
         get_xtr_file_date(file_stem)
 
 
+@pytest.mark.parametrize(
+    "file_stem, expected",
+    [
+        ("ADER00FRA_R_20230010000_01D_30S_MO", date(2023, 1, 1)),
+        ("ADER00FRA_R_20230600000_01D_30S_MO", date(2023, 3, 1)),
+        ("ADER00FRA_R_20240600000_01D_30S_MO", date(2024, 2, 29)),
+        ("ADER00FRA_R_20243660000_01D_30S_MO", date(2024, 12, 31)),
+    ],
+)
+def test_get_rinex3_file_date(file_stem, expected):
+    assert get_rinex3_file_date(file_stem) == expected
+
+
+@pytest.mark.parametrize("file_stem", ["ADER00FRA_R_20230000000_01D", "ADER00FRA_R_2023ss"])
+def test_get_rinex3_file_date_bad_arguments(file_stem):
+    with pytest.raises(ValueError):
+        get_rinex3_file_date(file_stem)
+
+
 def test_get_station_id():
     file = Path("ADER00FRA-2023-01-02.xtr")
     assert get_xtr_station_id(file) == "ADER00FRA"
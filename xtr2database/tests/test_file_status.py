@@ -0,0 +1,73 @@
+from datetime import date
+
+from xtr2database.file_status import changed_rows, scan_file_status, update_summaries, week_start
+
+
+class FakeCursor:
+    def __init__(self):
+        self.queries = []
+
+    def execute(self, query, params=None):
+        self.queries.append((str(query), params))
+
+
+def test_week_start():
+    assert week_start(date(2023, 1, 2)) == date(2023, 1, 2)
+    assert week_start(date(2023, 1, 8)) == date(2023, 1, 2)
+    assert week_start(date(2023, 1, 1)) == date(2022, 12, 26)
+
+
+def test_update_summaries():
+    cur = FakeCursor()
+    update_summaries(cur, [(1, date(2023, 1, 31)), (1, date(2023, 1, 30)), (2, date(2023, 2, 1))])
+
+    (weekly, weekly_params), (monthly, monthly_params) = cur.queries
+    assert "'file_status_weekly'" in weekly
+    assert "'file_status_monthly'" in monthly
+
+    # une seule période par station et par semaine
+    assert weekly_params == ([1, 2], [date(2023, 1, 30)] * 2, [date(2023, 2, 6)] * 2)
+    assert monthly_params == ([1, 2], [date(2023, 1, 1), date(2023, 2, 1)], [date(2023, 2, 1), date(2023, 3, 1)])
+
+    # rien à mettre à jour
+    cur = FakeCursor()
+    update_summaries(cur, [])
+    assert cur.queries == []
+
+
+def test_changed_rows():
+    statuses = {
+        ("ADER00FRA", date(2023, 1, 2)): (True, True),
+        ("ADER00FRA", date(2023, 1, 3)): (True, True),
+        ("AGDE00FRA", date(2023, 1, 2)): (False, True),
+    }
+    existing = {
+        (1, date(2023, 1, 2)): (True, True),
+        (1, date(2023, 1, 3)): (True, False),
+    }
+
+    # les jours inchangés ne sont pas renvoyés
+    assert changed_rows(statuses, {"ADER00FRA": 1, "AGDE00FRA": 2}, existing) == [
+        (date(2023, 1, 3), 1, True, True),
+        (date(2023, 1, 2), 2, False, True),
+    ]
+
+
+def test_scan_file_status(tmp_path):
+    files = [
+        "rinex/2023/002/ADER00FRA_R_20230020000_01D_30S_MO.crx.gz",
+        "rinex/2023/003/ADER00FRA_R_20230030000_01D_30S_MO.crx.gz",
+        "xtr/2023/002/ADER00FRA-2023-01-02.xtr.gz",
+        "xtr/2023/002/AGDE00FRA-2023-01-02.xtr.gz",
+        "xtr/2023/002/notes.txt",
+    ]
+    for name in files:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+
+    assert scan_file_status(tmp_path / "rinex", tmp_path / "xtr", ".xtr.gz") == {
+        ("ADER00FRA", date(2023, 1, 2)): (True, True),
+        ("ADER00FRA", date(2023, 1, 3)): (True, False),
+        ("AGDE00FRA", date(2023, 1, 2)): (False, True),
+    }
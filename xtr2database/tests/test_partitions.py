@@ -0,0 +1,65 @@
+from datetime import date
+
+from xtr2database.partitions import create_partitions, drop_partitions, ensure_partitions, next_month, partition_name
+
+
+class FakeCursor:
+    def __init__(self, partitions, partitioned=True):
+        self.partitions = partitions
+        self.partitioned = partitioned
+        self.queries = []
+        self.rows = []
+
+    def execute(self, query, params=None):
+        query = str(query)
+        self.queries.append(query)
+
+        if "pg_partitioned_table" in query:
+            self.rows = [{"res": self.partitioned}]
+        elif "pg_inherits" in query:
+            self.rows = [{"name": name, "station_partitions": n} for name, n in self.partitions.items()]
+        else:
+            self.rows = []
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+def test_partition_name():
+    assert partition_name(date(2023, 1, 1)) == "skyplot_y2023m01"
+    assert next_month(date(2023, 1, 1)) == date(2023, 2, 1)
+    assert next_month(date(2023, 12, 1)) == date(2024, 1, 1)
+
+
+def test_create_partitions():
+    cur = FakeCursor({"skyplot_y2023m01": 4, "skyplot_default": 0})
+
+    created = create_partitions(cur, date(2022, 12, 15), date(2023, 2, 3))
+    assert created == [date(2022, 12, 1), date(2023, 2, 1)]
+
+    # le découpage par station de la partition la plus récente est repris
+    creations = [q for q in cur.queries if "create table" in q]
+    assert len(creations) == 2 * (1 + 4)
+    assert "skyplot_y2022m12_s3" in creations[4]
+
+
+def test_ensure_partitions():
+    cur = FakeCursor({})
+    assert ensure_partitions(cur, ["ADER00FRA-2023-01-31", "ADER00FRA-2023-01-02"]) == [
+        date(2023, 1, 1),
+        date(2023, 2, 1),
+    ]
+
+    cur = FakeCursor({}, partitioned=False)
+    assert ensure_partitions(cur, ["ADER00FRA-2023-01-31"]) == []
+    assert len(cur.queries) == 1
+
+
+def test_drop_partitions():
+    cur = FakeCursor({"skyplot_y2022m12": 0, "skyplot_y2023m01": 0, "skyplot_y2023m02": 0})
+
+    assert drop_partitions(cur, date(2023, 1, 15)) == [date(2022, 12, 1)]
+    assert any("skyplot_y2022m12" in q and "drop table" in q for q in cur.queries)
@@ -0,0 +1,118 @@
+import gzip
+from pathlib import Path
+from textwrap import dedent
+
+import pytest
+
+from xtr2database.reader import Section, XtrFile, gunzip, index_sections, unique_xtr_files
+
+DATA = Path(__file__).parent / "data"
+XTR_FILE = DATA / "ADER00FRA-2023-01-02.xtr"
+
+
+@pytest.fixture
+def small_xtr():
+    return dedent(
+        """\
+    #====== Unknown section
+    line
+
+    #====== Band available (v 3.x)
+    #NxBAND
+    GPSCBN 2023-01-02 00:00:00    10
+
+    #====== Code multipath (v 3.x)
+    #GNSMxx
+    """
+    )
+
+
+def test_index_sections(small_xtr):
+    offsets = index_sections(small_xtr)
+
+    assert set(offsets) == {Section.BAND_AVAILABLE, Section.CODE_MULTIPATH}
+
+    start, end = offsets[Section.BAND_AVAILABLE]
+    assert small_xtr[start:end].startswith("#====== Band available")
+    assert small_xtr[end:].startswith("#====== Code multipath")
+
+
+def test_xtr_file_section(small_xtr):
+    xtr = XtrFile(small_xtr)
+
+    assert Section.BAND_AVAILABLE in xtr
+    assert Section.SUMMARY_STATISTICS not in xtr
+
+    lines = xtr.section(Section.BAND_AVAILABLE)
+    assert next(lines) == "#NxBAND\n"
+    assert next(lines) == "GPSCBN 2023-01-02 00:00:00    10\n"
+    assert next(lines) == "\n"
+    # la lecture peut continuer au delà de la section
+    assert next(lines) == "#====== Code multipath (v 3.x)\n"
+    assert next(lines) == "#GNSMxx\n"
+    with pytest.raises(StopIteration):
+        next(lines)
+
+    # en octets, y compris au delà de la section
+    lines = xtr.section(Section.BAND_AVAILABLE, binary=True)
+    assert next(lines) == b"#NxBAND\n"
+    assert list(lines)[-2:] == [b"#====== Code multipath (v 3.x)\n", b"#GNSMxx\n"]
+
+
+def test_xtr_file_section_crlf(small_xtr, tmp_path):
+    path = tmp_path / "ADER00FRA-2023-01-02.xtr"
+    path.write_bytes(small_xtr.replace("\n", "\r\n").encode("ascii"))
+    xtr = XtrFile.open(path)
+
+    assert Section.BAND_AVAILABLE in xtr
+
+    # les fins de ligne sont les mêmes que pour un fichier Unix, dans la section et au delà
+    assert list(xtr.section(Section.BAND_AVAILABLE)) == list(XtrFile(small_xtr).section(Section.BAND_AVAILABLE))
+    assert list(xtr.section(Section.BAND_AVAILABLE, binary=True)) == [
+        line.encode("ascii") for line in XtrFile(small_xtr).section(Section.BAND_AVAILABLE)
+    ]
+
+
+def test_xtr_file_open():
+    xtr = XtrFile.open(XTR_FILE)
+
+    for section in Section:
+        assert section in xtr
+
+
+def test_xtr_file_open_gziped(tmp_path):
+    # la compression est détectée quel que soit le nom du fichier
+    compressed = tmp_path / "ADER00FRA-2023-01-02.xtr"
+    compressed.write_bytes(gzip.compress(XTR_FILE.read_bytes()))
+
+    assert XtrFile.open(compressed)._data == XtrFile.open(XTR_FILE)._data[:]
+
+
+def test_gunzip_members():
+    data = gzip.compress(b"abc\n") + gzip.compress(b"def\n")
+    assert gunzip(data) == b"abc\ndef\n"
+
+    with pytest.raises(EOFError):
+        gunzip(data[:-10])
+
+
+def test_xtr_file_open_empty(tmp_path):
+    empty = tmp_path / "ADER00FRA-2023-01-02.xtr"
+    empty.touch()
+
+    xtr = XtrFile.open(empty)
+    assert all(section not in xtr for section in Section)
+
+
+def test_index_sections_bytes(small_xtr):
+    assert index_sections(small_xtr.encode("ascii")) == index_sections(small_xtr)
+
+
+def test_unique_xtr_files():
+    files = [
+        Path("a/ADER00FRA-2023-01-02.xtr"),
+        Path("b/ADER00FRA-2023-01-02.xtr.gz"),
+        Path("ADER00FRA-2023-01-03.xtr"),
+    ]
+    assert unique_xtr_files(files) == [Path("b/ADER00FRA-2023-01-02.xtr.gz"), Path("ADER00FRA-2023-01-03.xtr")]
+    assert unique_xtr_files(files[1::-1]) == [Path("b/ADER00FRA-2023-01-02.xtr.gz")]
@@ -0,0 +1,91 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from xtr2database import scanner
+from xtr2database.scanner import DirectoryScanner, manifest_path, scan_files
+
+
+@pytest.fixture
+def archive(tmp_path):
+    root = tmp_path / "archive"
+    for name in ["2023/001/ADER00FRA-2023-01-01.xtr", "2023/002/ADER00FRA-2023-01-02.xtr", "2023/002/notes.txt"]:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+
+    return root
+
+
+def names(files):
+    return sorted(Path(f).name for f in files)
+
+
+def test_scan_files(archive):
+    assert names(scan_files(archive, ".xtr")) == ["ADER00FRA-2023-01-01.xtr", "ADER00FRA-2023-01-02.xtr"]
+
+
+def test_scan_files_manifest(archive, tmp_path, monkeypatch):
+    # pas de délai de sécurité pour pouvoir tester tout de suite
+    monkeypatch.setattr(scanner, "_RACY_DELAY", -3600)
+    manifest_dir = tmp_path / "cache"
+
+    scan_files(archive, ".xtr", manifest_dir)
+    assert manifest_path(manifest_dir, archive).exists()
+
+    read = []
+    original = DirectoryScanner._read_directory
+
+    def spy(self, path):
+        read.append(path)
+        return original(self, path)
+
+    monkeypatch.setattr(DirectoryScanner, "_read_directory", spy)
+
+    # rien n'a changé, aucun répertoire n'est relu
+    assert names(scan_files(archive, ".xtr", manifest_dir)) == ["ADER00FRA-2023-01-01.xtr", "ADER00FRA-2023-01-02.xtr"]
+    assert read == []
+
+    # ajout d'un fichier : seul son répertoire est relu
+    new_file = archive / "2023" / "001" / "ADER00FRA-2023-01-03.xtr"
+    new_file.touch()
+    directory = new_file.parent
+    stat = os.stat(directory)
+    os.utime(directory, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert "ADER00FRA-2023-01-03.xtr" in names(scan_files(archive, ".xtr", manifest_dir))
+    assert read == [str(directory)]
+
+
+def test_save_concurrent(archive, tmp_path):
+    # deux parcours enregistrent le même manifeste : chacun a son fichier temporaire
+    manifest = manifest_path(tmp_path / "cache", archive)
+    first, second = DirectoryScanner(archive, manifest), DirectoryScanner(archive, manifest)
+    first.files(".xtr")
+    second.files(".xtr")
+
+    assert DirectoryScanner(archive, manifest)._directories == first._directories
+    assert [path.name for path in manifest.parent.iterdir()] == [manifest.name]
+
+
+def test_save_only_when_changed(archive, tmp_path, monkeypatch):
+    monkeypatch.setattr(scanner, "_RACY_DELAY", -3600)
+    manifest = manifest_path(tmp_path / "cache", archive)
+
+    dir_scanner = DirectoryScanner(archive, manifest)
+    dir_scanner.files(".xtr")
+    saved = os.stat(manifest).st_mtime_ns
+    os.utime(manifest, ns=(saved - 10_000_000_000, saved - 10_000_000_000))
+
+    # rien n'a changé (ni dans ce parcours, ni pour un nouveau) : le manifeste n'est pas réécrit
+    dir_scanner.files(".xtr")
+    DirectoryScanner(archive, manifest).files(".xtr")
+    assert os.stat(manifest).st_mtime_ns == saved - 10_000_000_000
+
+    # suppression d'un répertoire
+    for path in (archive / "2023" / "001").iterdir():
+        path.unlink()
+    (archive / "2023" / "001").rmdir()
+    dir_scanner.files(".xtr")
+    assert os.stat(manifest).st_mtime_ns != saved - 10_000_000_000
@@ -0,0 +1,137 @@
+from array import array
+from datetime import date
+from io import BytesIO
+from textwrap import dedent
+
+import pytest
+
+from xtr2database.metrics import skyplot
+from xtr2database.metrics.skyplot import MISSING
+
+DAY = date(2023, 1, 2)
+
+
+@pytest.fixture
+def elevation_azimut():
+    data = dedent(
+        """\
+    #GNSELE yyyy-mm-dd hh:mm:ss  nSat   01  02  03
+    GPSELE 2023-01-02 00:00:00     2   10   -   45
+    GPSELE 2023-01-02 00:00:30     3   11  20   46
+    GALELE 2023-01-02 00:00:00     1    -  60
+
+    #GNSAZI yyyy-mm-dd hh:mm:ss  nSat   01  02  03
+    GPSAZI 2023-01-02 00:00:00     2  100   -  300
+    GPSAZI 2023-01-02 00:00:30     3  101 200  301
+    GALAZI 2023-01-02 00:00:00     1    -  90
+
+    """
+    )
+    return BytesIO(data.encode("ascii"))
+
+
+@pytest.fixture
+def multipath():
+    data = dedent(
+        """\
+    GPSM1C 2023-01-02 00:00:00     2   31   -   33
+    GPSM1C 2023-01-02 00:00:30     3   41  42   43
+
+    GPSM2W 2023-01-02 00:00:30     3   51  52   53
+    GPSM2W 2023-01-02 00:01:00     3   61  62   63
+
+
+    """
+    )
+    return BytesIO(data.encode("ascii"))
+
+
+def test_epoch_offset():
+    assert skyplot.epoch_offset("00:00:00") == 0
+    assert skyplot.epoch_offset("01:02:03") == 3723
+    assert skyplot.epoch_offset("23:59:30") == 86370
+
+
+def test_extract_elevation_azimut(elevation_azimut):
+    data = skyplot.create_dest()
+    skyplot.extract_elevation_azimut(elevation_azimut, data, DAY)
+
+    gps = data["GPS"][DAY]
+    assert gps.width == 3
+    assert list(gps.epochs) == [0, 30]
+    assert list(gps.ele) == [10, MISSING, 45, 11, 20, 46]
+    assert list(gps.azi) == [100, MISSING, 300, 101, 200, 301]
+
+    gal = data["GAL"][DAY]
+    assert gal.width == 2
+    assert list(gal.ele) == [MISSING, 60]
+    assert list(gal.azi) == [MISSING, 90]
+
+
+def test_extract_multipath(elevation_azimut, multipath):
+    data = skyplot.create_dest()
+    skyplot.extract_elevation_azimut(elevation_azimut, data, DAY)
+    skyplot.extract_multipath(multipath, data, DAY)
+
+    gps = data["GPS"][DAY]
+    assert list(gps.mp["1C"]) == [31, MISSING, 33, 41, 42, 43]
+    # l'époque sans élévation est ignorée
+    assert list(gps.mp["2W"]) == [MISSING, MISSING, MISSING, 51, 52, 53]
+
+
+def test_block_widen():
+    block = skyplot.SkyplotBlock()
+    block.add_epoch(0, array("h", [1, 2]))
+    block.set_row(block.column("mp", "1C"), 0, array("h", [3]))
+    block.add_epoch(30, array("h", [4, 5, 6]))
+
+    assert block.width == 3
+    assert list(block.ele) == [1, 2, MISSING, 4, 5, 6]
+    assert list(block.mp["1C"]) == [3, MISSING, MISSING, MISSING, MISSING, MISSING]
+    assert block.row_index(30) == 1
+    assert block.row_index(30, 1) is None
+    assert block.row_index(60) is None
+
+
+def test_serialize_block(elevation_azimut, multipath):
+    data = skyplot.create_dest()
+    skyplot.extract_elevation_azimut(elevation_azimut, data, DAY)
+    skyplot.extract_multipath(multipath, data, DAY)
+
+    gps = data["GPS"][DAY]
+    gps.cs[30, 2] = ["1C"]
+
+    used_mp = [skyplot._get_skyplot_obs_type("GPS", n, gps.mp) for n in (1, 2, 5)]
+    assert used_mp == ["1C", "2W", None]
+
+    empty = array("h", [MISSING]) * (len(gps) * gps.width)
+    columns = [gps.ele, gps.azi, gps.mp["1C"], gps.mp["2W"], empty, empty, empty, empty]
+    text = skyplot._serialize_block(gps, (DAY, 1, 3), columns, used_mp)
+
+    assert text.splitlines() == [
+        "0\t2023-01-02\t1\t3\t1\t10\t100\t31\t\\N\t\\N\t\\N\t\\N\t\\N\tf\tf\tf",
+        "0\t2023-01-02\t1\t3\t3\t45\t300\t33\t\\N\t\\N\t\\N\t\\N\t\\N\tf\tf\tf",
+        "30\t2023-01-02\t1\t3\t1\t11\t101\t41\t51\t\\N\t\\N\t\\N\t\\N\tf\tf\tf",
+        "30\t2023-01-02\t1\t3\t2\t20\t200\t42\t52\t\\N\t\\N\t\\N\t\\N\tt\tf\tf",
+        "30\t2023-01-02\t1\t3\t3\t46\t301\t43\t53\t\\N\t\\N\t\\N\t\\N\tf\tf\tf",
+    ]
+
+
+def test_rollup_block(elevation_azimut, multipath):
+    data = skyplot.create_dest()
+    skyplot.extract_elevation_azimut(elevation_azimut, data, DAY)
+    skyplot.extract_multipath(multipath, data, DAY)
+
+    gps = data["GPS"][DAY]
+    gps.cs[30, 2] = ["1C"]
+
+    empty = array("h", [MISSING]) * (len(gps) * gps.width)
+    columns = [gps.ele, gps.azi, gps.mp["1C"], gps.mp["2W"], empty, empty, empty, empty]
+    rows = sorted(skyplot._rollup_block(gps, (DAY, 1, 3), columns, ["1C", "2W", None]))
+
+    # les points d'un satellite restent dans la même cellule d'une époque à l'autre
+    assert rows == [
+        (DAY, 1, 3, 10, 100, 2, 36.0, 51.0, None, None, None, None, 0, 0, 0),
+        (DAY, 1, 3, 20, 200, 1, 42.0, 52.0, None, None, None, None, 1, 0, 0),
+        (DAY, 1, 3, 45, 300, 2, 38.0, 53.0, None, None, None, None, 0, 0, 0),
+    ]
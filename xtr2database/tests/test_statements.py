@@ -0,0 +1,168 @@
+import asyncio
+from pathlib import Path
+
+from xtr2database.statements import Copy, Execute, run_statements, run_statements_async, upsert_rows
+from xtr2database.xtr_import import get_station_data, station_statements
+
+XTR_FILE = Path(__file__).parent / "data" / "ADER00FRA-2023-01-02.xtr"
+
+
+class FakeCopy:
+    def __init__(self, record):
+        self.record = record
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def set_types(self, types):
+        self.record["types"] = types
+
+    def write_row(self, row):
+        self.record["rows"].append(row)
+
+    def write(self, chunk):
+        self.record["rows"].append(chunk)
+
+
+class FakeCursor:
+    def __init__(self):
+        self.log = []
+
+    def execute(self, query, params=None):
+        self.log.append(("execute", str(query), params))
+
+    def copy(self, query):
+        record = {"types": None, "rows": []}
+        self.log.append(("copy", str(query), record))
+        return FakeCopy(record)
+
+
+class FakeAsyncCopy(FakeCopy):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def write_row(self, row):
+        super().write_row(row)
+
+    async def write(self, chunk):
+        super().write(chunk)
+
+
+class FakeAsyncCursor(FakeCursor):
+    async def execute(self, query, params=None):
+        super().execute(query, params)
+
+    def copy(self, query):
+        return FakeAsyncCopy(super().copy(query).record)
+
+
+class FakeFetcher:
+    """
+    Donne des IDs fixes, et note l'état du curseur à chaque récupération.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def _get(self, cur, key):
+        self.calls.append((key, len(cur.log) if cur is not None else None))
+        return 1
+
+    def get_network_id(self, cur, name):
+        return self._get(cur, name)
+
+    def get_station_id(self, cur, name, *args):
+        return self._get(cur, name)
+
+    def get_ids(self, cur, table, keys):
+        return {key: self._get(cur, key) for key in keys}
+
+
+def test_run_statements():
+    cur = FakeCursor()
+
+    def statements():
+        yield Execute("select %s", (1,))
+        # le générateur reprend après la requête précédente
+        assert len(cur.log) == 1
+        yield Copy("copy t from stdin", iter(["a\n", "b\n"]))
+        yield Copy("copy t from stdin (format binary)", [(1,), (2,)], ("int2",))
+
+    run_statements(cur, statements())
+
+    assert cur.log == [
+        ("execute", "select %s", (1,)),
+        ("copy", "copy t from stdin", {"types": None, "rows": ["a\n", "b\n"]}),
+        ("copy", "copy t from stdin (format binary)", {"types": ("int2",), "rows": [(1,), (2,)]}),
+    ]
+
+
+def test_station_statements():
+    data = get_station_data([str(XTR_FILE)])
+    cur = FakeCursor()
+    fetcher = FakeFetcher()
+
+    run_statements(cur, station_statements(cur, fetcher, data, "ADER00FRA", "RENAG"))
+
+    # chaque table passe par une table temporaire
+    copies = [query for kind, query, _ in cur.log if kind == "copy"]
+    assert len(copies) == 5
+    for copy, table in zip(copies, ["sig2noise", "multipath", "observation_cs", "satellite_cs", "skyplot"]):
+        assert f"'tmp_{table}'" in copy
+
+    queries = [query for _, query, _ in cur.log]
+    assert "do update" in queries[2]
+    assert "do nothing" in queries[-2]
+    assert "inserted_file" in queries[-1]
+    assert cur.log[-1][2] == ["ADER00FRA-2023-01-02", 1]
+
+    assert fetcher.calls[:2] == [("RENAG", 0), ("ADER00FRA", 0)]
+
+
+def test_station_statements_rollup():
+    data = get_station_data([str(XTR_FILE)], metrics=["skyplot_rollup"])
+    cur = FakeCursor()
+
+    run_statements(cur, station_statements(cur, FakeFetcher(), data, "ADER00FRA", "RENAG", ["skyplot_rollup"]))
+
+    # seulement le skyplot agrégé, au format binaire
+    copies = [(query, record) for kind, query, record in cur.log if kind == "copy"]
+    assert len(copies) == 1
+    assert "'tmp_skyplot_rollup'" in copies[0][0]
+    assert copies[0][1]["types"][0] == "date"
+    assert copies[0][1]["rows"]
+
+
+def test_station_statements_async():
+    data = get_station_data([str(XTR_FILE)])
+    cur = FakeCursor()
+    run_statements(cur, station_statements(cur, FakeFetcher(), data, "ADER00FRA", "RENAG"))
+
+    async_cur = FakeAsyncCursor()
+    asyncio.run(run_statements_async(async_cur, station_statements(None, FakeFetcher(), data, "ADER00FRA", "RENAG")))
+
+    assert async_cur.log == cur.log
+
+
+def test_upsert_rows():
+    statements = list(
+        upsert_rows(
+            "t",
+            ("date", "station_id", "value"),
+            ("date", "int2", "float4"),
+            [(1, 1, 1.0), (1, 1, 2.0)],
+            ("station_id", "date"),
+        )
+    )
+
+    # la dernière rangée d'une même clé est gardée
+    assert list(statements[1].rows) == [(1, 1, 2.0)]
+    assert statements[1].types == ("date", "int2", "float4")
+    assert "do update" in str(statements[2].query)
+    assert "excluded" in str(statements[2].query)
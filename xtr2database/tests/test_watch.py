@@ -0,0 +1,130 @@
+import importlib
+import os
+from collections import defaultdict
+from types import SimpleNamespace
+
+import pytest
+from psycopg import OperationalError
+
+from xtr2database.watch import PendingFiles, Watcher
+
+watch = importlib.import_module("xtr2database.watch")
+
+
+def test_pending_files(tmp_path):
+    file = tmp_path / "ADER00FRA-2023-01-02.xtr"
+    file.write_text("début")
+    file = str(file)
+    mtime = os.stat(file).st_mtime
+
+    pending = PendingFiles(settle=30)
+
+    # vu pour la première fois
+    assert pending.ready([file], now=mtime + 60) == []
+    # inchangé mais modifié trop récemment
+    assert pending.ready([file], now=mtime + 10) == []
+    # inchangé depuis assez longtemps
+    assert pending.ready([file], now=mtime + 60) == [file]
+
+
+def test_pending_files_still_written(tmp_path):
+    file = tmp_path / "ADER00FRA-2023-01-02.xtr"
+    file.write_text("début")
+    file = str(file)
+
+    pending = PendingFiles(settle=0)
+    assert pending.ready([file]) == []
+
+    with open(file, "a") as f:
+        f.write(" suite")
+
+    # la taille a changée entre deux passages
+    assert pending.ready([file]) == []
+    assert pending.ready([file]) == [file]
+
+
+def test_pending_files_forget_missing(tmp_path):
+    pending = PendingFiles(settle=0)
+    assert pending.ready([str(tmp_path / "absent.xtr")]) == []
+
+
+class FakeConnection:
+    closed = False
+
+    def __init__(self):
+        self.log = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def cursor(self):
+        return self
+
+    def commit(self):
+        self.log.append("commit")
+
+    def rollback(self):
+        self.log.append("rollback")
+
+
+def test_import_station_per_file(tmp_path, monkeypatch):
+    files = [str(tmp_path / f"ADER00FRA-2023-01-0{day}.xtr") for day in (1, 2, 3)]
+    for file in files:
+        open(file, "w").close()
+
+    def fake_get_station_data(batch, metrics=None):
+        if batch == [files[1]]:
+            raise ValueError("fichier invalide")
+        return [], None, (None, None), [os.path.basename(batch[0]).split(".", 1)[0]]
+
+    conn = FakeConnection()
+    monkeypatch.setattr(watch, "get_station_data", fake_get_station_data)
+    monkeypatch.setattr(watch, "insert_into_database", lambda *args: None)
+
+    watcher = Watcher.__new__(Watcher)
+    watcher.args = SimpleNamespace(metrics=None, network="RENAG")
+    watcher.inserted_files = defaultdict(set)
+    watcher._failed = {}
+
+    watcher._import_station(conn, None, "ADER00FRA", files)
+
+    # seul le fichier en erreur est annulé et sera réessayé
+    assert conn.log == ["commit", "rollback", "commit"]
+    assert watcher.inserted_files["ADER00FRA"] == {"ADER00FRA-2023-01-01", "ADER00FRA-2023-01-03"}
+    assert list(watcher._failed) == [files[1]]
+
+
+@pytest.mark.parametrize("error", [OperationalError("serveur arrêté"), RuntimeError("connexion fermée")])
+def test_import_station_connection_lost(tmp_path, monkeypatch, error):
+    files = [str(tmp_path / f"ADER00FRA-2023-01-0{day}.xtr") for day in (1, 2, 3)]
+    for file in files:
+        open(file, "w").close()
+
+    conn = FakeConnection()
+
+    def fake_insert_into_database(cur, fetcher, station_data, *args):
+        if station_data[3] == ["ADER00FRA-2023-01-02"]:
+            conn.closed = True
+            raise error
+
+    def fake_get_station_data(batch, metrics=None):
+        return [], None, (None, None), [os.path.basename(batch[0]).split(".", 1)[0]]
+
+    monkeypatch.setattr(watch, "get_station_data", fake_get_station_data)
+    monkeypatch.setattr(watch, "insert_into_database", fake_insert_into_database)
+
+    watcher = Watcher.__new__(Watcher)
+    watcher.args = SimpleNamespace(metrics=None, network="RENAG")
+    watcher.inserted_files = defaultdict(set)
+    watcher._failed = {}
+
+    # le passage est abandonné, sans marquer de fichier en erreur : tous seront réessayés
+    with pytest.raises(type(error)):
+        watcher._import_station(conn, None, "ADER00FRA", files)
+
+    assert conn.log == ["commit"]
+    assert watcher.inserted_files["ADER00FRA"] == {"ADER00FRA-2023-01-01"}
+    assert watcher._failed == {}
@@ -0,0 +1,368 @@
+import importlib
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+from xtr2database import get_args
+from xtr2database.metrics.skyplot import MISSING
+from xtr2database.statements import Execute
+from xtr2database.xtr_import import batched, get_all_files, get_station_data
+
+XTR_FILE = Path(__file__).parent / "data" / "ADER00FRA-2023-01-02.xtr"
+DAY = date(2023, 1, 2)
+
+# le module, masqué dans le paquet par la fonction du même nom
+xtr_import = importlib.import_module("xtr2database.xtr_import")
+
+
+@pytest.mark.parametrize(
+    "files, batch_size, expected",
+    [
+        (["a", "b", "c"], None, [["a", "b", "c"]]),
+        (["a", "b", "c"], 0, [["a", "b", "c"]]),
+        (["a", "b", "c"], 1, [["a"], ["b"], ["c"]]),
+        (["a", "b", "c"], 2, [["a", "b"], ["c"]]),
+        (["a", "b", "c"], 5, [["a", "b", "c"]]),
+    ],
+)
+def test_batched(files, batch_size, expected):
+    assert batched(files, batch_size) == expected
+
+
+def test_get_station_data():
+    (sig2noise, multipath, observation_cs, satellite_cs), skyplot_data, coords, files = get_station_data(
+        [str(XTR_FILE)]
+    )
+
+    assert files == ["ADER00FRA-2023-01-02"]
+    assert coords == (42.813272271, 0.379894785)
+
+    assert sig2noise["data"]["observation_type"] == ["1C", "1X"]
+    assert sig2noise["data"]["value"] == [44.0, 41.0]
+    assert multipath["data"]["value"] == [35.5, 40.25, 0.0]
+    assert observation_cs["data"]["constellation"] == ["GPS", "GAL"]
+    assert satellite_cs["data"]["nb_sat"] == [1, 1]
+    assert satellite_cs["data"]["avg_sat"] == [11, 4]
+
+    gps = skyplot_data["GPS"][DAY]
+    assert list(gps.ele) == [10, MISSING, 45, 11, 20, 46]
+    assert list(gps.sig2noise["1C"]) == [44, MISSING, 43, 45, 46, 47]
+    assert gps.cs == {(30, 2): ["1C"]}
+
+
+def test_get_station_data_metrics():
+    time_series, skyplot_data, coords, files = get_station_data([str(XTR_FILE)], metrics=["multipath", "satellite_cs"])
+
+    assert [t["type"] for t in time_series] == ["multipath", "satellite_cs"]
+    assert skyplot_data is None
+    assert coords == (42.813272271, 0.379894785)
+
+    satellite_cs = time_series[1]["data"]
+    assert satellite_cs["nb_sat"] == [1, 1]
+    assert satellite_cs["avg_sat"] == [11, 4]
+
+
+def test_get_station_data_skyplot_only():
+    time_series, skyplot_data, _, _ = get_station_data([str(XTR_FILE)], metrics=["skyplot"])
+
+    assert time_series == ()
+    assert skyplot_data["GPS"][DAY].cs == {(30, 2): ["1C"]}
+    assert list(skyplot_data["GPS"][DAY].mp["2W"]) == [MISSING, MISSING, MISSING, 51, 52, 53]
+
+
+@pytest.fixture
+def archive(tmp_path):
+    names = [
+        "BOUF00FRA-2023-01-02.xtr",
+        "ADER00FRA-2023-01-03.xtr",
+        "ADER00FRA-2023-01-01.xtr",
+        "ADER00FRA-2023-01-02.xtr",
+        "BOUF00FRA-2023-01-01.xtr",
+    ]
+    for i, name in enumerate(names):
+        path = tmp_path / str(i % 2) / name
+        path.parent.mkdir(exist_ok=True)
+        path.touch()
+
+    return tmp_path
+
+
+def test_get_all_files(archive):
+    files = get_all_files(archive)
+
+    assert [f.name for f in files] == [
+        "ADER00FRA-2023-01-01.xtr",
+        "ADER00FRA-2023-01-02.xtr",
+        "ADER00FRA-2023-01-03.xtr",
+        "BOUF00FRA-2023-01-01.xtr",
+        "BOUF00FRA-2023-01-02.xtr",
+    ]
+
+
+def test_get_all_files_blacklist(archive):
+    blacklist = {"ADER00FRA": {"ADER00FRA-2023-01-01", "ADER00FRA-2023-01-03"}, "BOUF00FRA": {"ADER00FRA-2023-01-02"}}
+    files = get_all_files(archive, blacklist)
+
+    assert [f.name for f in files] == [
+        "ADER00FRA-2023-01-02.xtr",
+        "BOUF00FRA-2023-01-01.xtr",
+        "BOUF00FRA-2023-01-02.xtr",
+    ]
+
+
+def test_get_all_files_watermarks(archive):
+    files = get_all_files(archive, watermarks={"ADER00FRA": "ADER00FRA-2023-01-02"})
+
+    assert [f.name for f in files] == [
+        "ADER00FRA-2023-01-03.xtr",
+        "BOUF00FRA-2023-01-01.xtr",
+        "BOUF00FRA-2023-01-02.xtr",
+    ]
+
+
+def test_get_all_files_gziped(archive):
+    (archive / "0" / "AGDE00FRA-2023-01-01.xtr.gz").touch()
+
+    # sans l'option, les fichiers compressés ou non sont gardés
+    assert [f.name for f in get_all_files(archive)][:2] == ["ADER00FRA-2023-01-01.xtr", "ADER00FRA-2023-01-02.xtr"]
+    assert "AGDE00FRA-2023-01-01.xtr.gz" in [f.name for f in get_all_files(archive)]
+    assert [f.name for f in get_all_files(archive, gziped=True)] == ["AGDE00FRA-2023-01-01.xtr.gz"]
+
+
+class FakeConnection:
+    def __init__(self):
+        self.log = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def cursor(self):
+        return self
+
+    def commit(self):
+        self.log.append("commit")
+
+    def rollback(self):
+        self.log.append("rollback")
+
+
+def test_process_station_stops_at_error(monkeypatch):
+    conn = FakeConnection()
+
+    def fake_get_station_data(files, metrics=None, cache=None):
+        if files == ["b"]:
+            raise ValueError("fichier invalide")
+        return files
+
+    monkeypatch.setattr(xtr_import, "get_station_data", fake_get_station_data)
+    monkeypatch.setattr(xtr_import, "insert_into_database", lambda cur, fetcher, data, *args: conn.log.extend(data))
+
+    xtr_import.process_station(lambda: conn, None, "ADER00FRA", ["a", "b", "c"], "RENAG", batch_size=1)
+
+    # les fichiers validés se suivent depuis le début de la station
+    assert conn.log == ["a", "commit", "rollback"]
+
+
+def test_get_all_files_both_forms(archive):
+    # un même jour compressé et non compressé n'est traité qu'une fois
+    (archive / "0" / "ADER00FRA-2023-01-01.xtr.gz").touch()
+
+    names = [f.name for f in get_all_files(archive)]
+    assert names[0] == "ADER00FRA-2023-01-01.xtr.gz"
+    assert "ADER00FRA-2023-01-01.xtr" not in names
+    assert len(names) == 5
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        ["import", "--batch-size", "-1"],
+        ["import", "--workers", "0"],
+        ["import", "--writers", "-2"],
+        ["import", "--writers", "quatre"],
+        ["--pool-max-size", "0", "import"],
+        ["--pool-min-size", "-1", "import"],
+    ],
+)
+def test_get_args_invalid_counts(monkeypatch, options):
+    monkeypatch.setattr(sys, "argv", ["xtr2database", *options, "xtr", "RENAG"])
+    with pytest.raises(SystemExit):
+        get_args()
+
+
+def test_get_args_whole_station(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["xtr2database", "import", "--batch-size", "0", "xtr", "RENAG"])
+    assert get_args().batch_size == 0
+
+
+class FakeFuture:
+    """
+    Tâche exécutée seulement lorsque son résultat est demandé.
+    """
+
+    def __init__(self, executor, fn, args):
+        self.executor = executor
+        self.fn = fn
+        self.args = args
+
+    def result(self):
+        self.executor.in_flight -= 1
+        return self.fn(*self.args)
+
+
+class FakeExecutor:
+    """
+    Exécuteur qui compte les tâches soumises dont le résultat n'a pas été demandé.
+    """
+
+    instances = []
+
+    def __init__(self, max_workers=None):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        FakeExecutor.instances.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def submit(self, fn, *args):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return FakeFuture(self, fn, args)
+
+
+class FakeProgress:
+    def __init__(self, *args, total=None):
+        self.total = total
+        self.names = []
+        self.updated = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def set_postfix_str(self, name):
+        self.names.append(name)
+
+    def update(self, nb_files):
+        self.updated += nb_files
+
+
+STATIONS = [("AAAA00FRA", ["a1", "a2", "a3"]), ("BBBB00FRA", ["b1", "b2"]), ("CCCC00FRA", ["c1", "c2", "c3", "c4"])]
+
+
+def fake_parse_station(files, metrics=None, cache=None):
+    if files == ["b2"]:
+        return None, "erreur de lecture b2"
+    return files, None
+
+
+@pytest.fixture
+def progress(monkeypatch):
+    progress = FakeProgress()
+    monkeypatch.setattr(xtr_import, "tqdm", lambda *args, total=None: progress)
+    monkeypatch.setattr(xtr_import, "DatabaseFetcher", lambda connection=None: "fetcher")
+    monkeypatch.setattr(xtr_import, "parse_station", fake_parse_station)
+    return progress
+
+
+def test_process_parallel(monkeypatch, progress):
+    FakeExecutor.instances = []
+    monkeypatch.setattr(xtr_import, "ProcessPoolExecutor", FakeExecutor)
+    monkeypatch.setattr(xtr_import, "ThreadPoolExecutor", FakeExecutor)
+
+    written = []
+
+    def fake_write_station(db_connection, fetcher, station_data, name, network, metrics=None):
+        assert fetcher == "fetcher"
+        written.extend(station_data)
+        return "erreur d'insertion c3" if station_data == ["c3"] else None
+
+    monkeypatch.setattr(xtr_import, "write_station", fake_write_station)
+
+    errors = xtr_import.process_parallel(
+        lambda: FakeConnection(), STATIONS, "RENAG", workers=1, writers=1, batch_size=1
+    )
+
+    # chaque erreur est rapportée pour sa station
+    assert errors == {"BBBB00FRA": ["erreur de lecture b2"], "CCCC00FRA": ["erreur d'insertion c3"]}
+    assert written == ["a1", "a2", "a3", "b1", "c1", "c2", "c3", "c4"]
+
+    # la progression suit l'ordre des stations
+    assert progress.names == ["AAAA00FRA"] * 3 + ["BBBB00FRA"] * 2 + ["CCCC00FRA"] * 4
+    assert progress.updated == 9
+
+    # lots en cours de lecture (2 * workers) et d'insertion (2 * writers) bornés
+    parsers, writers = FakeExecutor.instances
+    assert parsers.max_in_flight == 2
+    assert writers.max_in_flight == 2
+
+
+class FakeAsyncConnection:
+    """
+    Connexion (et curseur) asynchrone qui note les requêtes exécutées.
+    """
+
+    def __init__(self, log):
+        self.log = log
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    def connection(self):
+        return self
+
+    def cursor(self):
+        return self
+
+    async def execute(self, query, params=None):
+        self.log.extend(params)
+
+
+def test_process_async(monkeypatch, progress):
+    # lecture dans des threads, sans processus fils
+    monkeypatch.setattr(xtr_import, "ProcessPoolExecutor", ThreadPoolExecutor)
+
+    def fake_station_statements(cur, fetcher, station_data, name, network, metrics=None):
+        # les IDs sont récupérés par le fetcher, pas avec le curseur asynchrone
+        assert cur is None
+        assert fetcher == "fetcher"
+        if station_data == ["c3"]:
+            raise ValueError("erreur d'insertion c3")
+        yield Execute("insert", station_data)
+
+    monkeypatch.setattr(xtr_import, "station_statements", fake_station_statements)
+
+    written = []
+    errors = xtr_import.process_async(
+        lambda: FakeConnection(),
+        lambda: FakeAsyncConnection(written),
+        STATIONS,
+        "RENAG",
+        workers=2,
+        writers=2,
+        batch_size=1,
+    )
+
+    # toutes les connexions se sont arrêtées, après avoir inséré chaque lot lu une fois
+    assert sorted(errors) == ["BBBB00FRA", "CCCC00FRA"]
+    assert errors["BBBB00FRA"] == ["erreur de lecture b2"]
+    assert len(errors["CCCC00FRA"]) == 1 and "erreur d'insertion c3" in errors["CCCC00FRA"][0]
+    assert sorted(written) == ["a1", "a2", "a3", "b1", "c1", "c2", "c4"]
+
+    assert sorted(progress.names) == ["AAAA00FRA"] * 3 + ["BBBB00FRA"] * 2 + ["CCCC00FRA"] * 4
+    assert progress.updated == 9
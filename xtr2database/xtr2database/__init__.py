@@ -24,11 +24,73 @@ SOFTWARE.
 import argparse
 import os
 import sys
+from datetime import date
+from functools import partial
 from pathlib import Path
 
-from .database import create_db_connection
-from .xtr_import import xtr_import
+from .cache import DEFAULT_CACHE_MAX_SIZE, ParseCache, default_cache_dir
+from .database import DEFAULT_POOL_MAX_SIZE, DEFAULT_POOL_MIN_SIZE, create_async_db_pool, create_db_pool
+from .metrics import DEFAULT_METRICS, METRICS
+from .partitions import create_partitions, drop_partitions, get_partitions, is_partitioned, partition_name
+from .xtr_import import DEFAULT_BATCH_SIZE, DEFAULT_WRITERS, xtr_import
 from .file_status import file_status
+from .watch import DEFAULT_INTERVAL, DEFAULT_SETTLE, watch
+
+
+def metrics_list(value):
+    """
+    Valide une liste de métriques séparées par des virgules.
+    """
+    metrics = [m.strip() for m in value.split(",") if m.strip()]
+
+    unknown = [m for m in metrics if m not in METRICS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"métrique(s) inconnue(s) : {', '.join(unknown)}")
+
+    if not metrics:
+        raise argparse.ArgumentTypeError("aucune métrique donnée")
+
+    return metrics
+
+
+def positive_int(value):
+    """
+    Valide un entier strictement positif.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"entier invalide : {value}")
+
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"doit être strictement positif : {value}")
+
+    return number
+
+
+def non_negative_int(value):
+    """
+    Valide un entier positif ou nul.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"entier invalide : {value}")
+
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"doit être positif ou nul : {value}")
+
+    return number
+
+
+def date_arg(value):
+    """
+    Vérifie et convertit une date passée en argument.
+    """
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"date invalide : {value} (format attendu : AAAA-MM-JJ)")
 
 
 def get_args():
@@ -50,6 +112,20 @@ def get_args():
         "-P", "--password", help="Spécifie le mot de passe à utiliser pour se connecter à la base de données"
     )
 
+    parser.add_argument(
+        "--pool-min-size",
+        help=f"Nombre de connexions à la base de données gardées ouvertes (par défaut {DEFAULT_POOL_MIN_SIZE})",
+        type=non_negative_int,
+        default=DEFAULT_POOL_MIN_SIZE,
+    )
+
+    parser.add_argument(
+        "--pool-max-size",
+        help=f"Nombre maximal de connexions à la base de données (par défaut {DEFAULT_POOL_MAX_SIZE})",
+        type=positive_int,
+        default=DEFAULT_POOL_MAX_SIZE,
+    )
+
     parser.add_argument(
         "-o",
         "--override",
@@ -60,7 +136,29 @@ def get_args():
     parser.add_argument(
         "-z",
         "--gziped",
-        help="Recherche des fichiers .xtr.gz au lieux de .xtr, et décompresse-les à la volée si besoin",
+        help="Ne recherche que les fichiers .xtr.gz (par défaut, les fichiers .xtr et .xtr.gz sont recherchés, "
+        "la compression étant détectée pour chaque fichier)",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--cache-dir",
+        help=f"Répertoire du cache des fichiers xtr lus (par défaut {default_cache_dir()})",
+        type=Path,
+        default=default_cache_dir(),
+    )
+
+    parser.add_argument(
+        "--cache-max-size",
+        help=f"Taille maximale du cache des fichiers xtr lus, en Mo (par défaut {DEFAULT_CACHE_MAX_SIZE})",
+        type=int,
+        default=DEFAULT_CACHE_MAX_SIZE,
+    )
+
+    parser.add_argument(
+        "--incremental-scan",
+        help="Garde le contenu des répertoires parcourus (dans le répertoire du cache) "
+        "pour ne relire que les répertoires modifiés lors des exécutions suivantes",
         action="store_true",
     )
 
@@ -74,7 +172,95 @@ def get_args():
     xtr_import.add_argument("network", help="Le réseau de station dont proviennent les fichiers")
 
     xtr_import.add_argument(
-        "--parallel", help="Traite les stations en parallèle sur plusieurs processus. Experimental", action="store_true"
+        "--newer-only",
+        help="En mode strict, ne traite que les fichiers plus récents que le dernier fichier inséré "
+        "de chaque station",
+        action="store_true",
+    )
+
+    xtr_import.add_argument(
+        "-m",
+        "--metrics",
+        help=f"Liste des métriques à extraire et insérer, séparées par des virgules, parmi {','.join(METRICS)} "
+        f"(par défaut : {','.join(DEFAULT_METRICS)})",
+        type=metrics_list,
+    )
+
+    xtr_import.add_argument(
+        "-b",
+        "--batch-size",
+        help="Lit, insère et valide les fichiers d'une station par lots de cette taille, "
+        f"0 pour toute la station d'un coup (par défaut {DEFAULT_BATCH_SIZE})",
+        type=non_negative_int,
+        default=DEFAULT_BATCH_SIZE,
+    )
+
+    xtr_import.add_argument(
+        "--cache",
+        help="Garde les données lues dans chaque fichier xtr dans un cache sur disque, "
+        "pour ne pas relire les fichiers inchangés lors d'une prochaine importation",
+        action="store_true",
+    )
+
+    xtr_import.add_argument(
+        "--parallel", help="Traite les stations en parallèle sur plusieurs processus", action="store_true"
+    )
+
+    xtr_import.add_argument(
+        "--async",
+        help="Comme --parallel, mais les données sont insérées par des connexions asynchrones "
+        "pendant la lecture des fichiers suivants",
+        action="store_true",
+        dest="use_async",
+    )
+
+    xtr_import.add_argument(
+        "-j",
+        "--workers",
+        help="Nombre de processus de lecture des fichiers en mode parallèle ou asynchrone "
+        "(par défaut, le nombre de coeurs)",
+        type=positive_int,
+    )
+
+    xtr_import.add_argument(
+        "--writers",
+        help="Nombre de connexions d'insertion simultanées en mode parallèle ou asynchrone "
+        f"(par défaut {DEFAULT_WRITERS})",
+        type=positive_int,
+        default=DEFAULT_WRITERS,
+    )
+
+    # importation continue des fichiers xtr
+    watch = subparsers.add_parser(
+        "watch", help="Surveille un répertoire et importe les fichiers xtr d'un réseau dès qu'ils apparaissent"
+    )
+
+    watch.add_argument("xtr_files", help="Sources des fichiers xtr à surveiller", type=Path)
+
+    watch.add_argument("network", help="Le réseau de station dont proviennent les fichiers")
+
+    watch.add_argument(
+        "-i",
+        "--interval",
+        help=f"Temps entre deux parcours du répertoire, en secondes (par défaut {DEFAULT_INTERVAL})",
+        type=float,
+        default=DEFAULT_INTERVAL,
+    )
+
+    watch.add_argument(
+        "--settle",
+        help="Temps depuis la dernière modification d'un fichier avant de le considérer complet, "
+        f"en secondes (par défaut {DEFAULT_SETTLE})",
+        type=float,
+        default=DEFAULT_SETTLE,
+    )
+
+    watch.add_argument(
+        "-m",
+        "--metrics",
+        help=f"Liste des métriques à extraire et insérer, séparées par des virgules, parmi {','.join(METRICS)} "
+        f"(par défaut : {','.join(DEFAULT_METRICS)})",
+        type=metrics_list,
     )
 
     # verification de la disponibilité des fichiers
@@ -91,7 +277,100 @@ def get_args():
         help="Le réseau de station dont proviennent les fichiers",
     )
 
-    return parser.parse_args()
+    # gestion des partitions de la table skyplot
+    partitions = subparsers.add_parser(
+        "partitions", help="Gère les partitions mensuelles de la table skyplot (si elle est partitionnée)"
+    )
+
+    partitions.add_argument(
+        "action",
+        help="list : affiche les partitions, create : crée les partitions des mois de --from à --to, "
+        "drop : supprime les partitions antérieures à --before",
+        choices=["list", "create", "drop"],
+    )
+
+    partitions.add_argument("--from", help="Premier jour à couvrir (AAAA-MM-JJ)", type=date_arg, dest="start")
+
+    partitions.add_argument(
+        "--to", help="Dernier jour à couvrir (AAAA-MM-JJ, par défaut le même que --from)", type=date_arg, dest="end"
+    )
+
+    partitions.add_argument(
+        "--before", help="Les partitions finissant avant ce jour sont supprimées (AAAA-MM-JJ)", type=date_arg
+    )
+
+    partitions.add_argument(
+        "--station-partitions",
+        help="Nombre de sous-partitions par station des partitions créées "
+        "(par défaut, celui de la partition la plus récente)",
+        type=int,
+    )
+
+    # gestion du cache
+    cache = subparsers.add_parser("cache", help="Gère le cache des fichiers xtr lus")
+
+    cache.add_argument(
+        "action",
+        help="prune : supprime les entrées les moins récemment utilisées au delà de la taille maximale, "
+        "clear : vide le cache",
+        choices=["prune", "clear"],
+    )
+
+    args = parser.parse_args()
+
+    # En parallèle, les lots d'une station peuvent être validés dans le désordre : le
+    # dernier fichier inséré ne marque alors pas la reprise de l'importation
+    if args.mode == "import" and args.newer_only and (args.parallel or args.use_async):
+        parser.error("--newer-only ne peut pas être utilisé avec --parallel ou --async")
+
+    return args
+
+
+def manage_cache(args):
+    """
+    Élague ou vide le cache des fichiers xtr lus.
+    """
+    cache = ParseCache(args.cache_dir, args.cache_max_size)
+
+    if args.action == "clear":
+        removed, freed = cache.clear()
+    else:
+        removed, freed = cache.prune()
+
+    print(f"{removed} entrées supprimées ({freed / 1024 / 1024:.1f} Mo libérés).")
+    print(f"Taille du cache : {cache.size() / 1024 / 1024:.1f} Mo.")
+
+
+def manage_partitions(args, db_connection):
+    """
+    Affiche, crée ou supprime les partitions de la table skyplot.
+    """
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            if not is_partitioned(cur):
+                print("Erreur : la table skyplot n'est pas partitionnée (voir database/partition_skyplot.sql)")
+                sys.exit(-1)
+
+            if args.action == "create":
+                if args.start is None:
+                    print("Erreur : --from est nécessaire pour créer des partitions")
+                    sys.exit(-1)
+
+                created = create_partitions(cur, args.start, args.end or args.start, args.station_partitions)
+                print(len(created), "partitions créées.")
+
+            elif args.action == "drop":
+                if args.before is None:
+                    print("Erreur : --before est nécessaire pour supprimer des partitions")
+                    sys.exit(-1)
+
+                dropped = drop_partitions(cur, args.before)
+                print(len(dropped), "partitions supprimées.")
+
+            else:
+                for month, station_partitions in sorted(get_partitions(cur).items()):
+                    suffix = f"({station_partitions} sous-partitions)" if station_partitions else ""
+                    print(partition_name(month), suffix)
 
 
 def main():
@@ -100,6 +379,11 @@ def main():
     """
     args = get_args()
 
+    # Pas besoin de la base de données pour gérer le cache
+    if args.mode == "cache":
+        manage_cache(args)
+        return
+
     # Les arguments CLI sont prioritaire sur les variables d'env
     if not args.user:
         try:
@@ -115,9 +399,27 @@ def main():
 
     password = args.password or os.environ.get("X2D_PASSWORD")
 
-    db_connection = create_db_connection(user, password, args.remote_host, args.port)
+    pool_max_size = args.pool_max_size
+    if args.mode in ("import", "watch"):
+        # la connexion d'insertion, plus celle des objets partagés (voir `DatabaseFetcher`)
+        pool_max_size = max(pool_max_size, 2)
+    if args.mode == "import" and args.parallel:
+        # une connexion par thread d'insertion, plus celle des objets partagés
+        pool_max_size = max(pool_max_size, args.writers + 1)
+
+    pool = create_db_pool(
+        user, password, args.remote_host, args.port, min(args.pool_min_size, pool_max_size), pool_max_size
+    )
+
+    with pool:
+        db_connection = pool.connection
 
-    if args.mode == "import":
-        xtr_import(args, db_connection)
-    else:  # forcement file_status
-        file_status(args, db_connection)
+        if args.mode == "import":
+            async_pool = partial(create_async_db_pool, user, password, args.remote_host, args.port, 1, args.writers)
+            xtr_import(args, db_connection, async_pool)
+        elif args.mode == "watch":
+            watch(args, db_connection)
+        elif args.mode == "partitions":
+            manage_partitions(args, db_connection)
+        else:  # forcement file_status
+            file_status(args, db_connection)
@@ -0,0 +1,151 @@
+"""
+MIT License
+
+Copyright (c) 2023 Raphaël Caldwell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import hashlib
+import os
+import pickle
+import zlib
+from pathlib import Path
+
+# A incrémenter à chaque changement de la forme des données extraites
+CACHE_VERSION = 1
+
+DEFAULT_CACHE_MAX_SIZE = 2048  # Mo
+
+_SUFFIX = ".xtrc"
+
+
+def default_cache_dir():
+    """
+    Renvoie le répertoire par défaut du cache.
+    """
+    root = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(root) / "xtr2database"
+
+
+class ParseCache:
+    """
+    Cache sur disque des données extraites des fichiers xtr.
+
+    Les entrées sont identifiées par le chemin, la taille et la date de modification
+    du fichier (ainsi que les métriques extraites) : un fichier modifié est donc relu.
+    Les données sont sérialisées avec pickle puis compressées.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_CACHE_MAX_SIZE):
+        self.directory = Path(directory)
+        self.max_size = max_size * 1024 * 1024
+
+    def _entry_path(self, file, metrics):
+        stat = os.stat(file)
+        key = "|".join(
+            (
+                str(CACHE_VERSION),
+                os.path.abspath(file),
+                str(stat.st_size),
+                str(stat.st_mtime_ns),
+                ",".join(sorted(metrics)),
+            )
+        )
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return self.directory / digest[:2] / (digest + _SUFFIX)
+
+    def get(self, file, metrics):
+        """
+        Renvoie les données extraites d'un fichier si elles sont dans le cache, None sinon.
+        """
+        entry = self._entry_path(file, metrics)
+        try:
+            with open(entry, "rb") as f:
+                data = pickle.loads(zlib.decompress(f.read()))
+        except (OSError, EOFError, zlib.error, pickle.UnpicklingError):
+            return None
+
+        # la date de modification sert à l'éviction des entrées les plus anciennes
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+
+        return data
+
+    def put(self, file, metrics, data):
+        """
+        Enregistre les données extraites d'un fichier dans le cache.
+        """
+        entry = self._entry_path(file, metrics)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+
+        # écriture dans un fichier temporaire pour ne jamais laisser d'entrée incomplète
+        tmp = entry.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(zlib.compress(pickle.dumps(data, pickle.HIGHEST_PROTOCOL), 1))
+        os.replace(tmp, entry)
+
+    def _entries(self):
+        for entry in self.directory.glob("*/*" + _SUFFIX):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            yield entry, stat
+
+    def size(self):
+        """
+        Renvoie la taille totale des entrées du cache, en octets.
+        """
+        return sum(stat.st_size for _, stat in self._entries())
+
+    def prune(self, max_size=None):
+        """
+        Supprime les entrées les moins récemment utilisées jusqu'à ce que le cache
+        ne dépasse plus `max_size` octets (par défaut, la taille maximale du cache).
+        Renvoie le nombre d'entrées supprimées et la place libérée.
+        """
+        if max_size is None:
+            max_size = self.max_size
+
+        entries = sorted(self._entries(), key=lambda e: e[1].st_mtime)
+        total = sum(stat.st_size for _, stat in entries)
+
+        removed = 0
+        freed = 0
+        for entry, stat in entries:
+            if total - freed <= max_size:
+                break
+
+            try:
+                entry.unlink()
+            except OSError:
+                continue
+
+            removed += 1
+            freed += stat.st_size
+
+        return removed, freed
+
+    def clear(self):
+        """
+        Vide le cache.
+        """
+        return self.prune(0)
@@ -21,36 +21,94 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
-from functools import partial
+from collections import defaultdict
+from threading import Lock
 
-import psycopg
-from psycopg import ClientCursor
+from psycopg import AsyncClientCursor, ClientCursor
 from psycopg.rows import dict_row
 from psycopg.sql import SQL, Identifier
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
 
 from .metrics import TimeSeries
 
 
-def create_db_connection(user, password, remote_host, port):
-    """
-    Créer une fonction de connexion à la base de données.
-    """
-    return partial(
-        psycopg.connect,
+DEFAULT_POOL_MIN_SIZE = 1
+DEFAULT_POOL_MAX_SIZE = 4
+
+
+def _connection_kwargs(user, password, remote_host, port):
+    return dict(
         host=remote_host,
         port=port,
         dbname="quality_check_data",
         user=user,
         password=password,
         row_factory=dict_row,
-        cursor_factory=ClientCursor,
-    )  # type: ignore
+    )
+
+
+def create_db_pool(user, password, remote_host, port, min_size=DEFAULT_POOL_MIN_SIZE, max_size=DEFAULT_POOL_MAX_SIZE):
+    """
+    Créer un pool de connexions à la base de données.
+
+    `pool.connection()` s'utilise comme une connexion : la transaction est validée
+    à la sortie du bloc `with`, et la connexion est ensuite rendue au pool pour
+    être réutilisée.
+    """
+    return ConnectionPool(
+        kwargs=dict(_connection_kwargs(user, password, remote_host, port), cursor_factory=ClientCursor),
+        min_size=min_size,
+        max_size=max_size,
+        open=False,
+    )
+
+
+def create_async_db_pool(
+    user, password, remote_host, port, min_size=DEFAULT_POOL_MIN_SIZE, max_size=DEFAULT_POOL_MAX_SIZE
+):
+    """
+    Créer un pool de connexions asynchrones à la base de données, à ouvrir
+    (`async with pool`) dans la boucle d'évènements qui l'utilise.
+    """
+    return AsyncConnectionPool(
+        kwargs=dict(_connection_kwargs(user, password, remote_host, port), cursor_factory=AsyncClientCursor),
+        min_size=min_size,
+        max_size=max_size,
+        open=False,
+    )
 
 
 def clear_tables(cur, network):
     """
     Supprime les données des tables des metriques et skyplots.
+
+    Si aucun autre réseau n'a de stations, les tables sont vidées d'un coup (toutes
+    les partitions de la table skyplot comprises) plutôt que ligne par ligne.
+
+    La table `skyplot_rollup`, optionnelle (voir database/skyplot_rollup.sql), n'est
+    vidée que si elle existe.
     """
+    cur.execute(
+        """--sql
+        select
+            exists (
+                select from station s
+                inner join network n on s.network_id = n.id
+                where n.name <> %s
+            ) as res,
+            to_regclass('skyplot_rollup') is not null as has_rollup;
+        """,
+        (network,),
+    )
+    row = cur.fetchone()
+
+    skyplot_tables = ["skyplot", "skyplot_rollup"] if row["has_rollup"] else ["skyplot"]
+
+    if not row["res"]:
+        tables = [metric.value for metric in TimeSeries] + skyplot_tables + ["inserted_file"]
+        cur.execute(SQL("truncate {};").format(SQL(", ").join(map(Identifier, tables))))
+        return
+
     where_clause = """
         where s.station_id in (
             select sta.id
@@ -63,122 +121,216 @@ def clear_tables(cur, network):
     for metric in TimeSeries:
         cur.execute(SQL("delete from {} s" + where_clause).format(Identifier(metric.value)), (network,))
 
-    cur.execute("delete from skyplot s" + where_clause, (network,))
+    for table in skyplot_tables:
+        cur.execute(SQL("delete from {} s" + where_clause).format(Identifier(table)), (network,))
     cur.execute("delete from inserted_file s" + where_clause, (network,))
 
 
+# Tables de dimensions : colonne clé, colonnes remplies à la création (toutes avec la
+# clé) et type de la clé
+_DIMENSIONS = {
+    "network": ("name", ("name",), "text"),
+    "constellation": ("shortname", ("fullname", "shortname"), "text"),
+    "observation_type": ("type", ("type",), "text"),
+    "skyplot_date": ("date", ("date",), "date"),
+}
+
+
 class DatabaseFetcher:
     """
     Opérations de récupérations de la base de données, versions thread-safe et non.
+
+    Les IDs des tables de dimensions sont gardés en cache, par table, pour tout le
+    processus : le cache peut être rempli d'un coup avec `preload`, et les clés
+    absentes sont créées ensemble, en une requête par table.
+
+    En mode thread-safe, une connexion dédiée peut être donnée : les objets créés
+    sont alors commités immédiatement sur celle-ci, et donc visibles par les
+    transactions des autres connexions qui les utilisent.
     """
 
-    _database_fetch_cache = {}
+    _database_fetch_cache = defaultdict(dict)
+    _stations_without_coords = set()
+
+    def __init__(self, lock=None, connection=None):
+        if connection is not None and lock is None:
+            # la connexion dédiée est partagée, il faut la protéger
+            lock = Lock()
 
-    def __init__(self, lock=None):
         self._lock = lock
+        self._connection = connection
 
-    def _create(self, cur, key, fetch_query, insert_args):
+    def preload(self, cur):
         """
-        Créer un objet dans la base de donné parce qu'il n'existe pas.
+        Remplit le cache avec tout le contenu des tables de dimensions, une requête par table.
         """
-        cur.execute(fetch_query, (key,))
-        res = cur.fetchone()
+        for table, (key_column, _, _) in _DIMENSIONS.items():
+            cur.execute(SQL("select id, {} as key from {};").format(Identifier(key_column), Identifier(table)))
+            self._database_fetch_cache[table].update((r["key"], r["id"]) for r in cur)
 
-        if not res:
-            cur.execute(*insert_args)
-            obj_id = cur.fetchone()["id"]
-        else:
-            obj_id = res["id"]
-
-        self._database_fetch_cache[key] = obj_id
-        return obj_id
+        cur.execute("select id, network_id, fullname, lat from station;")
+        for r in cur:
+            self._cache_station((r["network_id"], r["fullname"]), r["id"], r["lat"])
 
-    def fetch_or_create(self, cur, key, fetch_query, *insert_args):
+    def get_ids(self, cur, table, keys):
         """
-        Récupère l'ID d'un objet à partir de la base de données ou crée un nouvel objet
-        avec l'ID spécifié si aucun n'existe dans la base de données.
+        Renvoie les IDs d'une table de dimensions (par clé), après avoir créé ceux des
+        `keys` qui n'existent pas encore dans la base de données.
         """
-        # Si l'id a déjà été recupéré, on le prend du cache
-        cached = self._database_fetch_cache.get(key, "-empty")
-        if cached != "-empty":
-            return cached
+        cache = self._database_fetch_cache[table]
 
-        if not self._lock:
-            return self._create(cur, key, fetch_query, insert_args)
+        missing = {key for key in keys if key not in cache}
+        if missing:
+            self._execute(cur, self._create, table, missing)
+
+        return cache
+
+    def _execute(self, cur, operation, *args):
+        """
+        Execute une opération de création avec `cur`, ou avec la connexion dédiée
+        (puis commit) si il y en a une.
+        """
+        if self._lock is None:
+            return operation(cur, *args)
 
         with self._lock:
-            return self._create(cur, key, fetch_query, insert_args)
+            if self._connection is None:
+                return operation(cur, *args)
+
+            with self._connection.cursor() as own_cur:
+                result = operation(own_cur, *args)
+            self._connection.commit()
+
+        return result
+
+    def _create(self, cur, table, keys):
+        """
+        Créer les objets d'une table de dimensions qui n'existent pas, et met leurs IDs en cache.
+        """
+        key_column, columns, key_type = _DIMENSIONS[table]
+
+        # Un autre thread a pu les créer entre temps. Les clés sont triées pour que
+        # des insertions simultanées ne s'interbloquent pas
+        cache = self._database_fetch_cache[table]
+        keys = sorted((key for key in keys if key not in cache), key=lambda k: (k is None, k))
+        if not keys:
+            return
+
+        # Les objets créés en même temps par une autre connexion ne sont pas renvoyés
+        # par l'insertion, ils sont récupérés ensuite
+        cur.execute(
+            SQL(
+                "insert into {table} ({columns}) select {values} from unnest(%s::{key_type}[]) as k "
+                "on conflict do nothing returning id, {key} as key;"
+            ).format(
+                table=Identifier(table),
+                columns=SQL(", ").join(map(Identifier, columns)),
+                values=SQL(", ").join(SQL("k") for _ in columns),
+                key_type=SQL(key_type),
+                key=Identifier(key_column),
+            ),
+            (keys,),
+        )
+        found = {r["key"]: r["id"] for r in cur}
+
+        remaining = [key for key in keys if key not in found]
+        if remaining:
+            cur.execute(
+                SQL("select id, {key} as key from {table} where {key} = any(%s::{key_type}[]);").format(
+                    table=Identifier(table), key=Identifier(key_column), key_type=SQL(key_type)
+                ),
+                (remaining,),
+            )
+            found.update((r["key"], r["id"]) for r in cur)
+
+        self._database_fetch_cache[table].update(found)
 
     def get_constellation_id(self, cur, constellation_shortname):
         """
         Récupère l'ID d'une constellation à partir de la base de données.
         """
-        return self.fetch_or_create(
-            cur,
-            constellation_shortname,
-            "select id from constellation where shortname = %s;",
-            "insert into constellation (fullname, shortname) values (%s, %s) returning id;",
-            (constellation_shortname, constellation_shortname),
-        )
+        return self.get_ids(cur, "constellation", (constellation_shortname,))[constellation_shortname]
 
     def get_observation_id(self, cur, observation_type):
         """
         Récupère l'ID d'un type d'observation à partir de la base de données.
         """
-        return self.fetch_or_create(
-            cur,
-            observation_type,
-            "select id from observation_type where type = %s;",
-            "insert into observation_type (type) values (%s) returning id;",
-            (observation_type,),
-        )
+        return self.get_ids(cur, "observation_type", (observation_type,))[observation_type]
 
     def get_network_id(self, cur, network_name):
         """
         Récupère l'ID d'un réseau de station à partir de la base de données.
         """
-        return self.fetch_or_create(
-            cur,
-            network_name,
-            "select id from network where name = %s;",
-            "insert into network (name) values (%s) returning id;",
-            (network_name,),
-        )
+        return self.get_ids(cur, "network", (network_name,))[network_name]
 
     def get_station_id(self, cur, station_fullname, network_id, station_lat=None, station_long=None):
         """
         Récupère l'ID d'une station à partir de la base de données.
         """
+        key = (network_id, station_fullname)
+        station_id = self._database_fetch_cache["station"].get(key)
+
+        # on repasse par la base de données si la station ne possède pas encore de coordonées
+        if station_id is not None and (station_lat is None or key not in self._stations_without_coords):
+            return station_id
+
+        return self.get_station_ids(cur, network_id, {station_fullname: (station_lat, station_long)})[station_fullname]
+
+    def get_station_ids(self, cur, network_id, stations):
+        """
+        Récupère les IDs de plusieurs stations d'un réseau, en une requête.
+
+        `stations` associe le nom de chaque station à ses coordonées (lat, long), qui
+        peuvent être None. Les stations qui n'existent pas sont créées, et celles qui
+        ne possèdent pas de coordonées reçoivent celles données. Renvoie les IDs par
+        nom de station.
+        """
+        return self._execute(cur, self._upsert_stations, network_id, stations)
+
+    def _upsert_stations(self, cur, network_id, stations):
+        names = list(stations)
+        params = {
+            "network_id": network_id,
+            "names": names,
+            "lats": [stations[name][0] for name in names],
+            "longs": [stations[name][1] for name in names],
+        }
+
+        # Les stations qui ne sont ni créées ni modifiées ne sont pas renvoyées par
+        # l'insertion, elles sont récupérées dans la même requête
         cur.execute(
-            f"""--sql
-            select id, lat
+            """--sql
+            with upserted as (
+                insert into station (network_id, shortname, fullname, lat, long)
+                select %(network_id)s, left(s.fullname, 4), s.fullname, s.lat, s.long
+                from unnest(%(names)s::text[], %(lats)s::float8[], %(longs)s::float8[]) as s (fullname, lat, long)
+                on conflict (fullname, network_id) do update
+                set lat = excluded.lat, long = excluded.long
+                where coalesce(station.lat, 0) = 0 and coalesce(excluded.lat, 0) <> 0
+                returning id, fullname, lat
+            )
+            select id, fullname, lat from upserted
+            union all
+            select id, fullname, lat
             from station
-            where network_id = {network_id} and fullname = %s;
+            where network_id = %(network_id)s
+                and fullname = any(%(names)s::text[])
+                and fullname not in (select fullname from upserted);
             """,
-            (station_fullname,),
+            params,
         )
-        res = cur.fetchone()
 
-        if not res:
-            cur.execute(
-                "insert into station (network_id, shortname, fullname, lat, long) values (%s, %s , %s, %s, %s) returning id;",
-                (network_id, station_fullname[:4], station_fullname, station_lat, station_long),
-            )
-            obj_id = cur.fetchone()["id"]
+        station_ids = {}
+        for r in cur:
+            station_ids[r["fullname"]] = r["id"]
+            self._cache_station((network_id, r["fullname"]), r["id"], r["lat"])
+
+        return station_ids
+
+    def _cache_station(self, key, station_id, station_lat):
+        self._database_fetch_cache["station"][key] = station_id
+
+        if station_lat:
+            self._stations_without_coords.discard(key)
         else:
-            obj_id = res["id"]
-
-            # si la station ne possède pas de coordonées, on les rajoute
-            if not res["lat"] and station_lat:
-                cur.execute(
-                    f"""--sql
-                    update station
-                    set lat = %s, long = %s
-                    where id = {obj_id};
-                    """,
-                    (station_lat, station_long),
-                )
-
-        self._database_fetch_cache[station_fullname] = obj_id
-
-        return obj_id
+            self._stations_without_coords.add(key)
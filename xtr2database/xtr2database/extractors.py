@@ -21,7 +21,12 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
-from datetime import datetime
+from datetime import date, timedelta
+
+# Les dates des noms de fichiers se répètent d'une station à l'autre, elles ne sont
+# donc décodées qu'une fois
+_xtr_dates = {}
+_rinex3_dates = {}
 
 
 def get_xtr_file_date(file_stem):
@@ -29,8 +34,15 @@ def get_xtr_file_date(file_stem):
     Renvoie la date d'un fichier xtr.
     """
     date_ = file_stem.split("-", 1)[1]
-    parsed = datetime.strptime(date_, "%Y-%m-%d")
-    return parsed.date()
+    try:
+        return _xtr_dates[date_]
+    except KeyError:
+        pass
+
+    # aaaa-mm-jj, sans passer par strptime
+    year, month, day = date_.split("-")
+    parsed = _xtr_dates[date_] = date(int(year), int(month), int(day))
+    return parsed
 
 
 def get_xtr_station_id(file):
@@ -45,13 +57,20 @@ def get_xtr_file_stem_station_id(file_stem):
 
 
 def get_rinex3_file_date(file_stem):
-    date_part = file_stem.split("_")[2]
+    date_part = file_stem.split("_")[2][:7]
+    try:
+        return _rinex3_dates[date_part]
+    except KeyError:
+        pass
 
+    # aaaajjj (jour de l'année)
     year = int(date_part[:4])
     day_number = int(date_part[4:7])
+    if not 1 <= day_number <= 366:
+        raise ValueError(f"date de fichier Rinex 3 invalide : {date_part!r}")
 
-    parsed = datetime.strptime(f"{year} {day_number}", "%Y %j")
-    return parsed.date()
+    parsed = _rinex3_dates[date_part] = date(year, 1, 1) + timedelta(days=day_number - 1)
+    return parsed
 
 
 def get_rinex3_station_id(file_stem):
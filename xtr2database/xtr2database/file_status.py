@@ -21,74 +21,184 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
-from collections import defaultdict
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+
+from psycopg.sql import SQL, Identifier
 
 from .extractors import get_rinex3_file_date, get_rinex3_station_id, get_xtr_file_date, get_xtr_file_stem_station_id
 from .database import DatabaseFetcher
-
-
-def process_files(file_type, files_gen, get_date, get_station, data_dict):
-    for file in files_gen:
-        station = get_station(file.stem)
-        date = get_date(file.stem)
-
-        data_dict[station][date][file_type] = True
-
-
-def _data_dict_default_factory():
-    #        V Date
-    return defaultdict(lambda: {"rinex": False, "xtr": False})
+from .partitions import month_start, next_month
+from .scanner import DirectoryScanner, get_manifest_dir, manifest_path
+from .reader import XTR_SUFFIXES, xtr_suffix
+from .statements import run_statements, upsert_rows
+
+
+def week_start(date):
+    # les semaines commencent le lundi, comme date_trunc('week', ...)
+    return date - dt.timedelta(days=date.weekday())
+
+
+def next_week(week):
+    return week + dt.timedelta(days=7)
+
+
+# Tables des résumés par station : début et fin de la période d'un jour
+_SUMMARIES = {
+    "file_status_weekly": (week_start, next_week),
+    "file_status_monthly": (month_start, next_month),
+}
+
+
+def _scan_days(root, suffix, get_station, get_date, manifest_dir=None):
+    """
+    Parcours un répertoire et renvoie l'ensemble des (station, date) des fichiers
+    dont le nom finit par `suffix`. Les noms sont décodés au fur et à mesure du
+    parcours, sans garder la liste des fichiers.
+    """
+    manifest = manifest_path(manifest_dir, root) if manifest_dir is not None else None
+
+    days = set()
+    for _, name in DirectoryScanner(root, manifest).iter_names(suffix):
+        file_stem = name.split(".", 1)[0]
+        days.add((get_station(file_stem), get_date(file_stem)))
+
+    return days
+
+
+def scan_file_status(rinex_root, xtr_root, xtr_suffixes=XTR_SUFFIXES, manifest_dir=None):
+    """
+    Parcours en même temps (dans deux threads) les répertoires des fichiers Rinex 3
+    et xtr. Renvoie, par (station, date), la présence d'un fichier Rinex 3 et d'un
+    fichier xtr.
+    """
+    with ThreadPoolExecutor(2) as pool:
+        rinex = pool.submit(
+            _scan_days, rinex_root, ".crx.gz", get_rinex3_station_id, get_rinex3_file_date, manifest_dir
+        )
+        xtr = pool.submit(
+            _scan_days, xtr_root, xtr_suffixes, get_xtr_file_stem_station_id, get_xtr_file_date, manifest_dir
+        )
+        rinex_days = rinex.result()
+        xtr_days = xtr.result()
+
+    return {day: (day in rinex_days, day in xtr_days) for day in rinex_days | xtr_days}
+
+
+def get_file_status(cur, station_ids):
+    """
+    Renvoie les status déjà enregistrés des stations données, par (station_id, date).
+    """
+    cur.execute(
+        """--sql
+        select station_id, date, has_rinex3, has_xtr
+        from file_status
+        where station_id = any(%s);
+        """,
+        (list(station_ids),),
+    )
+
+    return {(row["station_id"], row["date"]): (row["has_rinex3"], row["has_xtr"]) for row in cur}
+
+
+def changed_rows(statuses, station_ids, existing):
+    """
+    Renvoie les rangées (date, station_id, has_rinex3, has_xtr) des jours dont le
+    status (voir `scan_file_status`) n'est pas déjà enregistré tel quel dans `existing`.
+    """
+    rows = []
+    for (station_fullname, date), status in statuses.items():
+        station_id = station_ids[station_fullname]
+
+        if existing.get((station_id, date)) != status:
+            rows.append((date, station_id, *status))
+
+    return rows
+
+
+def update_summaries(cur, touched):
+    """
+    Recalcule, à partir de la table `file_status`, les résumés par semaine et par
+    mois des périodes contenant les jours modifiés. `touched` contient les couples
+    (station_id, date) modifiés.
+    """
+    touched = list(touched)
+
+    for table, (start_of, end_of) in _SUMMARIES.items():
+        periods = sorted({(station_id, start_of(date)) for station_id, date in touched})
+        if not periods:
+            continue
+
+        cur.execute(
+            SQL(
+                """--sql
+                insert into {} (station_id, date, days, rinex3_days, xtr_days, complete_days)
+                select
+                    p.station_id,
+                    p.start,
+                    count(*),
+                    count(*) filter (where fs.has_rinex3),
+                    count(*) filter (where fs.has_xtr),
+                    count(*) filter (where fs.has_rinex3 and fs.has_xtr)
+                from unnest(%s::smallint[], %s::date[], %s::date[]) as p (station_id, start, stop)
+                inner join file_status fs
+                    on fs.station_id = p.station_id and fs.date >= p.start and fs.date < p.stop
+                group by p.station_id, p.start
+                on conflict (station_id, date) do update
+                set
+                    days = excluded.days,
+                    rinex3_days = excluded.rinex3_days,
+                    xtr_days = excluded.xtr_days,
+                    complete_days = excluded.complete_days;
+                """
+            ).format(Identifier(table)),
+            (
+                [station_id for station_id, _ in periods],
+                [start for _, start in periods],
+                [end_of(start) for _, start in periods],
+            ),
+        )
 
 
 def file_status(args, db_connection):
     # Rassemblement des informations
-    rinex_files = args.rinex3_files
-    xtr_files = args.xtr_files
-
-    data = defaultdict(_data_dict_default_factory)
-
-    print("Traitement des fichiers Rinex 3...")
-    process_files("rinex", rinex_files.rglob("*.crx.gz"), get_rinex3_file_date, get_rinex3_station_id, data)
-
-    print("Traitement des fichiers xtr...")
-    pattern = "*.xtr.gz" if args.gziped else "*.xtr"
-    process_files("xtr", xtr_files.rglob(pattern), get_xtr_file_date, get_xtr_file_stem_station_id, data)
+    print("Parcours des fichiers Rinex 3 et xtr...")
+    statuses = scan_file_status(args.rinex3_files, args.xtr_files, xtr_suffix(args.gziped), get_manifest_dir(args))
 
     # Insertion dans la base de données
     fetcher = DatabaseFetcher()
-    to_insert_params = []
     with db_connection() as conn:
         with conn.cursor() as cur:
             if args.override:
                 print("Suppression des données pré-existantes...")
                 cur.execute("delete from file_status;")
+                cur.execute("delete from file_status_weekly;")
+                cur.execute("delete from file_status_monthly;")
 
             print("Insertion dans la base de données...")
 
-            # Récupération du réseau
+            # Récupération du réseau et de toutes ses stations
             network_id = fetcher.get_network_id(cur, args.network)
-
-            for station_fullname, station_data in data.items():
-                station_id = fetcher.get_station_id(cur, station_fullname, network_id)
-
-                for date, date_data in station_data.items():
-                    to_insert_params.append(
-                        {
-                            "date": date,
-                            "station_id": station_id,
-                            "rinex": date_data["rinex"],
-                            "xtr": date_data["xtr"],
-                        }
-                    )
-
-            cur.executemany(
-                """--sql
-                insert into file_status (date, station_id, has_rinex3, has_xtr)
-                values (%(date)s, %(station_id)s, %(rinex)s, %(xtr)s)
-                on conflict (date, station_id) do update
-                set has_rinex3 = %(rinex)s, has_xtr = %(xtr)s;
-                """,
-                to_insert_params,
-            )
+            stations = {station_fullname for station_fullname, _ in statuses}
+            station_ids = fetcher.get_station_ids(cur, network_id, dict.fromkeys(stations, (None, None)))
+
+            existing = {} if args.override else get_file_status(cur, station_ids.values())
+            to_insert = changed_rows(statuses, station_ids, existing)
+            print(f"{len(to_insert)} jour(s) nouveau(x) ou modifié(s)")
+
+            if to_insert:
+                run_statements(
+                    cur,
+                    upsert_rows(
+                        "file_status",
+                        ("date", "station_id", "has_rinex3", "has_xtr"),
+                        ("date", "int2", "bool", "bool"),
+                        to_insert,
+                        ("date", "station_id"),
+                    ),
+                )
+
+                print("Mise à jour des résumés par semaine et par mois...")
+                update_summaries(cur, ((station_id, date) for date, station_id, _, _ in to_insert))
 
     print("OK !")
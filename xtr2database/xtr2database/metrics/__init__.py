@@ -36,6 +36,15 @@ class TimeSeries(Enum):
     SATELLITE_CS = "satellite_cs"
 
 
+# Les skyplots ne sont pas une série temporelle mais peuvent être choisis comme elles
+SKYPLOT = "skyplot"
+# Skyplots agrégés par jour sur une grille élévation/azimut, seulement sur demande
+SKYPLOT_ROLLUP = "skyplot_rollup"
+
+METRICS = tuple(metric.value for metric in TimeSeries) + (SKYPLOT, SKYPLOT_ROLLUP)
+DEFAULT_METRICS = tuple(metric for metric in METRICS if metric != SKYPLOT_ROLLUP)
+
+
 def create_metric_dest(metric_type: TimeSeries):
     """
     Crée un dictionnaire qui contiendra les données d'une métrique.
@@ -48,6 +57,10 @@ def extract_from_section_header_into(f, dest, current_date):
     Extrait une donnée dans l'entête d'une section d'un fichier
     xtr et le formatte dans un format tabulaire, prêt pour une
     insertion dans une base de données.
+
+    Les lignes sont lues en octets, la section étant ensuite lue par les extracteurs
+    des skyplots. Sans destination, l'entête est seulement lue. Renvoie si l'entête
+    contient des données.
     """
     next(f)  # entête de section
     next(f)  # entête des moyennes
@@ -55,11 +68,11 @@ def extract_from_section_header_into(f, dest, current_date):
     # Extraction
     extracted = []
 
-    line: str = next(f)
-    while line.startswith("="):
+    line: bytes = next(f)
+    while line.startswith(b"="):
         splitted = line.split()
 
-        band = splitted[0][1:]  # "GPSS1C" par ex
+        band = splitted[0][1:].decode("ascii")  # "GPSS1C" par ex
         try:
             mean = float(splitted[3])
         except ValueError:
@@ -69,6 +82,9 @@ def extract_from_section_header_into(f, dest, current_date):
 
         line = next(f)
 
+    if dest is None:
+        return bool(extracted)
+
     # Mise en forme tabulaire
     data = dest["data"]
     for band, value in extracted:
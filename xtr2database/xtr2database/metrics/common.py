@@ -21,34 +21,34 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
-from psycopg.sql import SQL, Identifier
+from ..statements import upsert_rows
 
 
 def insert_header_section_metric(cur, fetcher, station_id, metric_data):
     """
-    Insère les données d'une métrique extraite dans l'entête d'une section
-    dans une base de données.
+    Génère les requêtes d'insertion des données d'une métrique extraite dans
+    l'entête d'une section.
     """
-    to_insert = []
     data = metric_data["data"]
-    for i in range(metric_data["length"]):
-        # Constellation
-        constellation_id = fetcher.get_constellation_id(cur, data["constellation"][i])
 
-        # Observation type
-        observation_id = fetcher.get_observation_id(cur, data["observation_type"][i])
+    # Les IDs sont récupérés avant la copie, la connexion ne pouvant pas
+    # executer d'autres requêtes pendant celle-ci
+    constellation_ids = fetcher.get_ids(cur, "constellation", data["constellation"])
+    observation_ids = fetcher.get_ids(cur, "observation_type", data["observation_type"])
 
-        # On colle tout ensemble
-        row = cur.mogrify(
-            "(%s,%s,%s,%s,%s)", (data["date"][i], station_id, constellation_id, observation_id, data["value"][i])
+    to_insert = [
+        (date, station_id, constellation_ids[constellation], observation_ids[observation_type], value)
+        for date, constellation, observation_type, value in zip(
+            data["date"], data["constellation"], data["observation_type"], data["value"]
         )
-        to_insert.append(row)
+    ]
 
     # On envoie dans la base de données si il y a des données à envoyer
     if to_insert:
-        cur.execute(
-            SQL("insert into {}(date, station_id, constellation_id, observation_type_id, value) values ")
-            .format(Identifier(metric_data["type"]))
-            .as_string(cur)
-            + ",".join(to_insert)
+        yield from upsert_rows(
+            metric_data["type"],
+            ("date", "station_id", "constellation_id", "observation_type_id", "value"),
+            ("date", "int2", "int2", "int2", "float4"),
+            to_insert,
+            ("station_id", "date", "constellation_id", "observation_type_id"),
         )
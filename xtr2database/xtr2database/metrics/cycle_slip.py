@@ -21,12 +21,11 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
-import datetime as dt
 from collections import defaultdict
 
-from psycopg.sql import SQL, Identifier
-
 from . import TimeSeries
+from ..statements import upsert_rows
+from .skyplot import epoch_offset, get_block
 
 try:  # Compatibilité python 3.7
     from statistics import fmean as mean  # type: ignore
@@ -37,7 +36,8 @@ except ImportError:
 def extract_from_sum_stats(f, observation_dest, satellite_dest, current_date):
     """
     Extraits des données de la section "Summary statistics" utilisé pour les
-    calculs des metriques observation cs et satellite cs.
+    calculs des metriques observation cs et satellite cs. L'une des deux
+    destinations peut être None si la métrique n'est pas demandée.
     """
     line: str = next(f)
 
@@ -78,19 +78,21 @@ def extract_from_sum_stats(f, observation_dest, satellite_dest, current_date):
         line = next(f)
 
     # formats tabulaire
-    obs_data = observation_dest["data"]
-    sat_data = satellite_dest["data"]
     for constel, (havep, csall, expobs) in extracted.items():
-        observation_dest["length"] += 1
-        obs_data["date"].append(current_date)
-        obs_data["constellation"].append(constel)
-        obs_data["value"].append(csall / expobs * 100)
+        if observation_dest is not None:
+            obs_data = observation_dest["data"]
+            observation_dest["length"] += 1
+            obs_data["date"].append(current_date)
+            obs_data["constellation"].append(constel)
+            obs_data["value"].append(csall / expobs * 100)
 
         # Première fonction a manipuler le satellite cs
-        satellite_dest["length"] += 1
-        sat_data["date"].append(current_date)
-        sat_data["constellation"].append(constel)
-        sat_data["havep"].append(havep)
+        if satellite_dest is not None:
+            sat_data = satellite_dest["data"]
+            satellite_dest["length"] += 1
+            sat_data["date"].append(current_date)
+            sat_data["constellation"].append(constel)
+            sat_data["havep"].append(havep)
 
     return len(extracted)
 
@@ -98,7 +100,8 @@ def extract_from_sum_stats(f, observation_dest, satellite_dest, current_date):
 def extract_from_prepro_res(f, satellite_dest, skyplot_dest, nb_constell, current_date):
     """
     Extraits des données de la section "Preprocessing results" utilisé pour les
-    calculs du satellite_cs ainsi que le tracage des skyplot de cycle slip.
+    calculs du satellite_cs ainsi que le tracage des skyplot de cycle slip. L'une
+    des deux destinations peut être None si la métrique n'est pas demandée.
     """
     line = next(f)
     while not line.startswith("#GNSSLP"):
@@ -112,19 +115,23 @@ def extract_from_prepro_res(f, satellite_dest, skyplot_dest, nb_constell, curren
 
     count = defaultdict(int)
     while line != "\n":  # NOTE : ici on arrive juste avant la section "Elevation & Azimuth"
-        splitted = line.split()
-
         constel = line[1:4]
-        time = dt.time.fromisoformat(splitted[2])
-        datetime = dt.datetime.combine(current_date, time)
-        sat_number = int(splitted[3][1:])
-        cs_bands = [bands[i] for i, b in enumerate(splitted[4:]) if b != "-"]
 
-        skyplot_dest[constel][datetime]["cs"][sat_number] = cs_bands
+        if skyplot_dest is not None:
+            splitted = line.split()
+
+            seconds = epoch_offset(splitted[2])
+            sat_number = int(splitted[3][1:])
+            cs_bands = [bands[i] for i, b in enumerate(splitted[4:]) if b != "-"]
+
+            get_block(skyplot_dest, constel, current_date).cs[seconds, sat_number] = cs_bands
 
         count[constel] += 1
         line = next(f)
 
+    if satellite_dest is None:
+        return
+
     sat_data = satellite_dest["data"]
     for i in range(satellite_dest["length"] - nb_constell, satellite_dest["length"]):
         constel = sat_data["constellation"][i]
@@ -158,49 +165,52 @@ def extract_from_band_avail(f, satellite_dest, nb_constell):
         sat_data["avg_sat"].append(mean(count[constel]) if len(count[constel]) > 0 else 1)
 
 
+_CONSTELLATION_METRIC_COLUMNS = ("date", "station_id", "constellation_id", "value")
+_CONSTELLATION_METRIC_TYPES = ("date", "int2", "int2", "float4")
+_CONSTELLATION_METRIC_KEY = ("station_id", "date", "constellation_id")
+
+
 def insert_observation(cur, fetcher, station_id, observation_cs):
     """
-    Insère dans la base de données les données de la metrique observation cs.
+    Génère les requêtes d'insertion des données de la metrique observation cs.
     """
-    to_insert = []
     data = observation_cs["data"]
-    for i in range(observation_cs["length"]):
-        constellation_id = fetcher.get_constellation_id(cur, data["constellation"][i])
-
-        row = cur.mogrify("(%s,%s,%s,%s)", (data["date"][i], station_id, constellation_id, data["value"][i]))
-        to_insert.append(row)
-
-    cur.execute(
-        SQL("insert into {}(date, station_id, constellation_id, value) values ")
-        .format(Identifier(TimeSeries.OBSERVATION_CS.value))
-        .as_string(cur)
-        + ",".join(to_insert)
-    )
+    constellation_ids = fetcher.get_ids(cur, "constellation", data["constellation"])
+
+    to_insert = [
+        (date, station_id, constellation_ids[constellation], value)
+        for date, constellation, value in zip(data["date"], data["constellation"], data["value"])
+    ]
+
+    if to_insert:
+        yield from upsert_rows(
+            TimeSeries.OBSERVATION_CS.value,
+            _CONSTELLATION_METRIC_COLUMNS,
+            _CONSTELLATION_METRIC_TYPES,
+            to_insert,
+            _CONSTELLATION_METRIC_KEY,
+        )
 
 
 def insert_satellite(cur, fetcher, station_id, satellite_cs):
     """
-    Insère dans la base de données les données de la metrique satellite cs.
+    Génère les requêtes d'insertion des données de la metrique satellite cs.
     """
-    to_insert = []
     data = satellite_cs["data"]
-    for i in range(satellite_cs["length"]):
-        constellation_id = fetcher.get_constellation_id(cur, data["constellation"][i])
-
-        row = cur.mogrify(
-            "(%s,%s,%s,%s)",
-            (
-                data["date"][i],
-                station_id,
-                constellation_id,
-                data["nb_sat"][i] / data["avg_sat"][i] / data["havep"][i] * 100,
-            ),
+    constellation_ids = fetcher.get_ids(cur, "constellation", data["constellation"])
+
+    to_insert = [
+        (date, station_id, constellation_ids[constellation], nb_sat / avg_sat / havep * 100)
+        for date, constellation, nb_sat, avg_sat, havep in zip(
+            data["date"], data["constellation"], data["nb_sat"], data["avg_sat"], data["havep"]
+        )
+    ]
+
+    if to_insert:
+        yield from upsert_rows(
+            TimeSeries.SATELLITE_CS.value,
+            _CONSTELLATION_METRIC_COLUMNS,
+            _CONSTELLATION_METRIC_TYPES,
+            to_insert,
+            _CONSTELLATION_METRIC_KEY,
         )
-        to_insert.append(row)
-
-    cur.execute(
-        SQL("insert into {}(date, station_id, constellation_id, value) values ")
-        .format(Identifier(TimeSeries.SATELLITE_CS.value))
-        .as_string(cur)
-        + ",".join(to_insert)
-    )
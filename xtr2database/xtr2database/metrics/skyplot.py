@@ -21,24 +21,133 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
-import datetime as dt
+from array import array
 from collections import defaultdict
+from itertools import chain, compress, repeat
 
+from psycopg.sql import SQL
 
-def _dd_callback():
+from ..statements import Execute, staged_copy, upsert_rows
+
+# Sentinelle des valeurs absentes dans les tableaux d'entiers 16 bits
+MISSING = -32768
+
+# Taille des cellules de la grille du skyplot agrégé, en degrés (voir database/skyplot_rollup.sql)
+ROLLUP_ELEVATION_STEP = 5
+ROLLUP_AZIMUT_STEP = 10
+
+
+class SkyplotBlock:
     """
-    Contruit la partie qui acceuil l'évélation, l'azimut ainsi que les multipath et
-    le sig2noise en fonction des bandes.
+    Données des skyplots d'une constellation pour une journée, stockées en colonnes.
+
+    Chaque ligne d'élévation du fichier ajoute une rangée de `width` valeurs (une
+    par satellite) à des tableaux d'entiers 16 bits : l'élévation, l'azimut, ainsi
+    que le multipath et le sig2noise de chaque bande. Les valeurs absentes valent
+    `MISSING`.
     """
-    return {
-        "ELE": [],
-        "AZI": [],
+
+    __slots__ = ("width", "epochs", "rows", "ele", "azi", "mp", "sig2noise", "cs")
+
+    def __init__(self):
+        self.width = 0
+
+        # secondes depuis minuit de chaque rangée, et première rangée de chaque époque
+        self.epochs = array("l")
+        self.rows = {}
+
+        self.ele = array("h")
+        self.azi = array("h")
         #     toute les bandes
-        "mp": {},
-        "sig2noise": {},
-        # si ça a cs
-        "cs": {},
-    }
+        self.mp = {}
+        self.sig2noise = {}
+        # bandes ayant un cs, par (époque, satellite)
+        self.cs = {}
+
+    def __len__(self):
+        return len(self.epochs)
+
+    def _columns(self):
+        yield self.ele
+        yield self.azi
+        yield from self.mp.values()
+        yield from self.sig2noise.values()
+
+    def _widen(self, width):
+        """
+        Élargit toutes les rangées pour acceuillir `width` satellites.
+        """
+        padding = array("h", [MISSING]) * (width - self.width)
+        for column in self._columns():
+            if not len(column):
+                continue
+
+            widened = array("h")
+            for start in range(0, len(column), self.width):
+                widened.extend(column[start : start + self.width])
+                widened.extend(padding)
+            column[:] = widened
+
+        self.width = width
+
+    def _padded(self, values):
+        if len(values) > self.width:
+            self._widen(len(values))
+
+        return values + array("h", [MISSING]) * (self.width - len(values))
+
+    def add_epoch(self, seconds, values):
+        """
+        Ajoute une rangée d'élévations.
+        """
+        values = self._padded(values)
+
+        self.rows.setdefault(seconds, len(self.epochs))
+        self.epochs.append(seconds)
+
+        # les autres colonnes suivent, vides
+        for column in self._columns():
+            if column is not self.ele and len(column):
+                column.extend(array("h", [MISSING]) * self.width)
+        self.ele.extend(values)
+
+    def row_index(self, seconds, i_line=0):
+        """
+        Renvoie l'index de la `i_line`-ième rangée d'une époque, ou None si elle n'existe pas.
+        """
+        first = self.rows.get(seconds)
+        if first is None:
+            return None
+
+        row = first + i_line
+        if row >= len(self.epochs) or self.epochs[row] != seconds:
+            return None
+
+        return row
+
+    def column(self, metric, band=None):
+        """
+        Renvoie le tableau d'une métrique (et d'une bande), créé vide au besoin.
+        """
+        if band is None:
+            column = getattr(self, metric)
+        else:
+            column = getattr(self, metric).get(band)
+            if column is None:
+                column = getattr(self, metric)[band] = array("h")
+
+        if not len(column) and len(self.epochs):
+            column.extend(array("h", [MISSING]) * (len(self.epochs) * self.width))
+
+        return column
+
+    def set_row(self, column, row, values):
+        """
+        Remplit une rangée d'une colonne.
+        """
+        values = self._padded(values)
+        start = row * self.width
+        column[start : start + self.width] = values
 
 
 def create_dest():
@@ -46,34 +155,105 @@ def create_dest():
     Contruit la structure de données qui acceuil les données pour les skyplots
     d'une station.
     """
-    #      constel             datetime
-    return defaultdict(lambda: defaultdict(_dd_callback))
+    #      constel    date -> SkyplotBlock
+    return defaultdict(dict)
 
 
-def _safe_to_int(value):
+def get_block(data, constel, date):
+    """
+    Renvoie les données du skyplot d'une constellation pour un jour, en les créant au besoin.
+    """
+    block = data[constel].get(date)
+    if block is None:
+        block = data[constel][date] = SkyplotBlock()
+
+    return block
+
+
+_epoch_offsets = {}
+
+
+def epoch_offset(time):
+    """
+    Renvoie le nombre de secondes depuis minuit d'une heure au format hh:mm:ss, en
+    texte ou en octets. Les heures sont les mêmes d'un fichier à l'autre, elles sont
+    donc mises en cache.
+    """
     try:
-        return int(value)
-    except ValueError:
-        return None
+        return _epoch_offsets[time]
+    except KeyError:
+        seconds = _epoch_offsets[time] = int(time[0:2]) * 3600 + int(time[3:5]) * 60 + int(time[6:8])
+        return seconds
+
+
+class _Int16Cache(dict):
+    """
+    Valeurs entières (16 bits) des champs déjà rencontrés, lus en octets. Les champs
+    des skyplots prennent peu de valeurs différentes, on évite ainsi de les convertir
+    à chaque ligne.
+    """
+
+    def __missing__(self, field):
+        try:
+            value = int(field)
+        except ValueError:
+            value = MISSING
+
+        # en dehors des valeurs possible d'un smallint
+        if not MISSING < value <= 32767:
+            value = MISSING
+
+        self[field] = value
+        return value
+
+
+_int16_values = _Int16Cache()
+
+
+class _LabelCache(dict):
+    """
+    Premier champ (décodé) des lignes des skyplots, "GPSELE" ou "GPSM1C" par exemple.
+    """
+
+    def __missing__(self, field):
+        label = self[field] = field.decode("ascii")
+        return label
+
+
+_labels = _LabelCache()
+
+
+def _parse_values(splitted):
+    return array("h", map(_int16_values.__getitem__, splitted[4:]))
 
 
 def _extract_coord(f, date, data):
     """
-    Extrait l'evevation où l'azimut.
+    Extrait l'evevation où l'azimut, à partir des lignes en octets de la section.
     """
     next(f)  # entête partie
 
+    seen = defaultdict(int)
     line = next(f)
-    while line != "\n":
+    while line != b"\n":
         splitted = line.split()
+        label = _labels[splitted[0]]
+
+        constel = label[0:3]
+        coord = label[3:7]  # ELE ou AZI
 
-        constel = splitted[0][0:3]
-        coord = splitted[0][3:7]  # ELE ou AZI
+        seconds = epoch_offset(splitted[2])
+        block = get_block(data, constel, date)
 
-        time = dt.time.fromisoformat(splitted[2])
-        line_datetime = dt.datetime.combine(date, time)
+        if coord == "ELE":
+            block.add_epoch(seconds, _parse_values(splitted))
+        else:
+            i_line = seen[constel, seconds]
+            seen[constel, seconds] += 1
 
-        data[constel][line_datetime][coord].append([_safe_to_int(v) for v in splitted[4:]])
+            row = block.row_index(seconds, i_line)
+            if row is not None:
+                block.set_row(block.column("azi"), row, _parse_values(splitted))
 
         line = next(f)
 
@@ -92,32 +272,40 @@ def extract_elevation_azimut(f, data, date):
 def _extract_individual_metric(f, data, date, metric_type):
     """
     Extrait une metrique "individuelle" : dans notre cas le multipath ou
-    le sig2noise.
+    le sig2noise, à partir des lignes en octets de la section.
     """
+    seen = defaultdict(int)
     while True:
         line = next(f)
 
-        if line == "\n":
+        if line == b"\n":
             # est-ce que on se situe entre deux bandes ou à
             # la fin des données à extraire
             line = next(f)
-            if line == "\n":
+            if line == b"\n":
                 # fin des données à extraire
                 break
 
         # on peut commencer à extraire
         splitted = line.split()
+        label = _labels[splitted[0]]
 
-        constel = splitted[0][0:3]
-        band = splitted[0][4:7]
+        constel = label[0:3]
+        band = label[4:7]
 
-        time = dt.time.fromisoformat(splitted[2])
-        line_datetime = dt.datetime.combine(date, time)
+        seconds = epoch_offset(splitted[2])
 
-        if band not in data[constel][line_datetime][metric_type].keys():
-            data[constel][line_datetime][metric_type][band] = []
+        i_line = seen[constel, band, seconds]
+        seen[constel, band, seconds] += 1
 
-        data[constel][line_datetime][metric_type][band].append([_safe_to_int(v) for v in splitted[4:]])
+        # seules les époques ayant une élévation sont gardées
+        block = data[constel].get(date) if constel in data else None
+        if block is None:
+            continue
+
+        row = block.row_index(seconds, i_line)
+        if row is not None:
+            block.set_row(block.column(metric_type, band), row, _parse_values(splitted))
 
 
 def extract_multipath(f, data, date):
@@ -141,186 +329,238 @@ _SKYPLOT_OBS_TYPE = {
 }
 
 
-def _get_skyplot_obs_type(constel, metric, number, i_line, i_coord, all_data):
+def _get_skyplot_obs_type(constel, number, bands):
     """
-    Renvoie le type d'observable sur lequel se baser pour créer des skyplots.
+    Renvoie le type d'observable sur lequel se baser pour créer des skyplots,
+    parmis les bandes disponibles d'une métrique.
     """
     try:
         band, backup = _SKYPLOT_OBS_TYPE[number][constel]
     except KeyError:
         # Si la constellation n'est pas dans le tableau
-        return None, None
+        return None
+
+    if band in bands:
+        return band
 
-    to_return = None
     used_band = None
-    try:
-        to_return = all_data[metric][band][i_line][i_coord]
-        used_band = band
-    except KeyError:
-        for key in all_data[metric].keys():
-            if key[0] == backup[0]:
-                to_return = all_data[metric][key][i_line][i_coord]
-                used_band = key
+    for key in bands.keys():
+        if key[0] == backup[0]:
+            used_band = key
 
-    return to_return, used_band
+    return used_band
 
 
-_already_inserted_obs_types = set()
+class _TextCache(dict):
+    """
+    Représentations textuelles (pour COPY) des valeurs déjà rencontrées.
+    """
 
+    def __missing__(self, value):
+        text = self[value] = str(value)
+        return text
+
+
+# Colonnes des rangées sérialisées par `_serialize_block`
+_SKYPLOT_COLUMNS = (
+    "epoch",
+    "date",
+    "station_id",
+    "constellation_id",
+    "satellite",
+    "elevation",
+    "azimut",
+    "mp1",
+    "mp2",
+    "mp5",
+    "sig2noise1",
+    "sig2noise2",
+    "sig2noise5",
+    "cs1",
+    "cs2",
+    "cs5",
+)
+
+
+def _serialize_block(block, prefix, columns, cs_columns):
+    """
+    Sérialise les rangées d'un bloc au format texte de COPY : chaque rangée commence
+    par son époque (en secondes depuis minuit), suivie des valeurs de `prefix`.
 
-def insert(cur, fetcher, station_id, skyplot_data):
+    Le texte est construit colonne par colonne : chaque colonne est filtrée (les
+    points sans élévation ou sans azimut sont ignorés) et convertie en une passe,
+    puis les lignes sont assemblées avec `str.join`.
     """
-    Insère les données du skyplot dans la base de données.
+    width = block.width
+    size = len(block.epochs) * width
+    text = _TextCache({MISSING: "\\N"})
+
+    ele, azi = columns[0], columns[1]
+    keep = [e != MISSING and a != MISSING for e, a in zip(ele[:size], azi[:size])]
+
+    # bandes ayant un cs, regroupées par époque
+    cs_by_epoch = defaultdict(dict)
+    for (seconds, satellite_number), cs_bands in block.cs.items():
+        if 1 <= satellite_number <= width:
+            cs_by_epoch[seconds][satellite_number] = "\t".join("t" if b in cs_bands else "f" for b in cs_columns)
+
+    # dernière colonne, qui termine aussi la ligne
+    cs = ["f\tf\tf\n"] * size
+    for row, seconds in enumerate(block.epochs):
+        for satellite_number, row_cs in cs_by_epoch.get(seconds, {}).items():
+            cs[row * width + satellite_number - 1] = row_cs + "\n"
+
+    prefix = "\t".join(map(str, prefix))
+    fields = [
+        compress(chain.from_iterable(repeat(f"{text[seconds]}\t{prefix}", width) for seconds in block.epochs), keep),
+        compress([text[sat] for sat in range(1, width + 1)] * len(block.epochs), keep),
+        *(map(text.__getitem__, compress(column, keep)) for column in columns),
+        compress(cs, keep),
+    ]
+
+    return "".join(map("\t".join, zip(*fields)))
+
+
+# Colonnes des rangées de `_rollup_block`, et leurs types
+_SKYPLOT_ROLLUP_COLUMNS = (
+    "date",
+    "station_id",
+    "constellation_id",
+    "elevation",
+    "azimut",
+    "points",
+    "mp1",
+    "mp2",
+    "mp5",
+    "sig2noise1",
+    "sig2noise2",
+    "sig2noise5",
+    "cs1",
+    "cs2",
+    "cs5",
+)
+_SKYPLOT_ROLLUP_TYPES = ("date", "int2", "int2", "int2", "int2", "int4") + ("float4",) * 6 + ("int4",) * 3
+_SKYPLOT_ROLLUP_KEY = ("station_id", "date", "constellation_id", "elevation", "azimut")
+
+
+def _rollup_block(block, prefix, columns, cs_columns):
     """
-    to_insert = []
+    Agrège les rangées d'un bloc par cellule de la grille élévation/azimut. Chaque
+    cellule donne une rangée commençant par `prefix`, suivie de la cellule (bornes
+    basses), du nombre de points, des moyennes du multipath et du sig2noise de chaque
+    bande, puis du nombre de cs de chaque bande.
+    """
+    width = block.width
 
-    for constel, constel_data in skyplot_data.items():
-        constellation_id = fetcher.get_constellation_id(cur, constel)
-
-        for datetime, all_data in constel_data.items():
-            date = datetime.date()
-            date_id = fetcher.fetch_or_create(
-                cur,
-                date,
-                "select id from skyplot_date where date = %s;",
-                "insert into skyplot_date (date) values (%s) returning id;",
-                (date,),
+    #     cellule -> [points, 6 sommes, 6 nombres de valeurs, 3 nombres de cs]
+    cells = {}
+    for row, seconds in enumerate(block.epochs):
+        start = row * width
+        stop = start + width
+
+        for sat, ele, azi, *values in zip(range(1, width + 1), *(column[start:stop] for column in columns)):
+            if ele == MISSING or azi == MISSING:
+                continue
+
+            key = (
+                ele // ROLLUP_ELEVATION_STEP * ROLLUP_ELEVATION_STEP,
+                azi % 360 // ROLLUP_AZIMUT_STEP * ROLLUP_AZIMUT_STEP,
             )
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = [0] * 16
+
+            cell[0] += 1
+            for i, value in enumerate(values):
+                if value != MISSING:
+                    cell[1 + i] += value
+                    cell[7 + i] += 1
+
+            cs_bands = block.cs.get((seconds, sat))
+            if cs_bands:
+                for i, band in enumerate(cs_columns):
+                    if band in cs_bands:
+                        cell[13 + i] += 1
+
+    for (elevation, azimut), cell in cells.items():
+        means = (cell[1 + i] / cell[7 + i] if cell[7 + i] else None for i in range(6))
+        yield (*prefix, elevation, azimut, cell[0], *means, *cell[13:16])
+
+
+def insert(cur, fetcher, station_id, skyplot_data, raw=True, rollup=False):
+    """
+    Génère les requêtes d'insertion des données du skyplot : les points eux-mêmes
+    si `raw`, et/ou leur agrégat par jour sur une grille élévation/azimut si `rollup`.
+    """
+    blocks = []
+    for constel, constel_data in skyplot_data.items():
+        for date, block in constel_data.items():
+            if not len(block) or not len(block.azi):
+                continue
 
-            # Pour chaque "lignes" de coordonées
-            for i_line, (ele_coords, azi_coords) in enumerate(zip(all_data["ELE"], all_data["AZI"])):
-                # On joint les coordonées ensemble (ele, azi)
-                for i_coord, (ele, azi) in enumerate(zip(ele_coords, azi_coords)):
-                    if ele is None:
-                        continue
-
-                    satellite_number = i_coord + 1
-
-                    mp1, used_mp1 = _get_skyplot_obs_type(constel, "mp", 1, i_line, i_coord, all_data)
-                    mp2, used_mp2 = _get_skyplot_obs_type(constel, "mp", 2, i_line, i_coord, all_data)
-                    mp5, used_mp5 = _get_skyplot_obs_type(constel, "mp", 5, i_line, i_coord, all_data)
-
-                    sig2noise1, used_sig2noise1 = _get_skyplot_obs_type(
-                        constel, "sig2noise", 1, i_line, i_coord, all_data
-                    )
-                    sig2noise2, used_sig2noise2 = _get_skyplot_obs_type(
-                        constel, "sig2noise", 2, i_line, i_coord, all_data
-                    )
-                    sig2noise5, used_sig2noise5 = _get_skyplot_obs_type(
-                        constel, "sig2noise", 5, i_line, i_coord, all_data
-                    )
-
-                    # insertion des used_* dans la bdd si ils n'y sont pas
-                    if (date_id, station_id, constellation_id) not in _already_inserted_obs_types:
-                        cur.execute(
-                            """--sql
-                            insert into skyplot_used_band
-                                (
-                                    date_id, station_id, constellation_id,
-                                    mp1_observation_type_id,
-                                    mp2_observation_type_id,
-                                    mp5_observation_type_id,
-                                    sig2noise1_observation_type_id,
-                                    sig2noise2_observation_type_id,
-                                    sig2noise5_observation_type_id
-                                )
-                            values (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                            on conflict do nothing;
-                            """,
-                            (
-                                date_id,
-                                station_id,
-                                constellation_id,
-                                fetcher.get_observation_id(cur, used_mp1),
-                                fetcher.get_observation_id(cur, used_mp2),
-                                fetcher.get_observation_id(cur, used_mp5),
-                                fetcher.get_observation_id(cur, used_sig2noise1),
-                                fetcher.get_observation_id(cur, used_sig2noise2),
-                                fetcher.get_observation_id(cur, used_sig2noise5),
-                            ),
-                        )
-
-                        _already_inserted_obs_types.add((date_id, station_id, constellation_id))
-
-                    # On determine si ça a cycle slip
-                    cs_bands = all_data["cs"].get(satellite_number, [])
-
-                    cs1 = used_mp1 in cs_bands
-                    cs2 = used_mp2 in cs_bands
-                    cs5 = used_mp5 in cs_bands
-
-                    # On peut enfin insèrer la rangée !
-                    row = "\t".join(
-                        map(
-                            str,
-                            (
-                                datetime,
-                                date_id,
-                                station_id,
-                                constellation_id,
-                                satellite_number,
-                                ele,
-                                azi,
-                                # Les mp1-5
-                                mp1,
-                                mp2,
-                                mp5,
-                                # Les sig2noise1-5
-                                sig2noise1,
-                                sig2noise2,
-                                sig2noise5,
-                                # Si ça a cycle slip
-                                cs1,
-                                cs2,
-                                cs5,
-                            ),
-                        )
-                    )
-
-                    to_insert.append(row)
-
-    with cur.connection.transaction():
-        # On est obligé de passer par une table intermédiaire parce que COPY
-        # ne supporte pas ON CONFLICT
-        cur.execute(
-            """--sql
-            create temporary table tmp_skyplot
-            (like skyplot including defaults)
-            on commit drop;
-            """
+            # Les bandes utilisées sont les mêmes pour tout le bloc
+            used_mp = [_get_skyplot_obs_type(constel, n, block.mp) for n in (1, 2, 5)]
+            used_sig2noise = [_get_skyplot_obs_type(constel, n, block.sig2noise) for n in (1, 2, 5)]
+            blocks.append((constel, date, block, used_mp, used_sig2noise))
+
+    # Les IDs de tout le skyplot sont récupérés d'un coup
+    constellation_ids = fetcher.get_ids(cur, "constellation", {b[0] for b in blocks})
+    date_ids = fetcher.get_ids(cur, "skyplot_date", {b[1] for b in blocks})
+    observation_ids = fetcher.get_ids(cur, "observation_type", {band for b in blocks for band in b[3] + b[4]})
+
+    to_insert = []
+    used_bands = []
+    for constel, date, block, used_mp, used_sig2noise in blocks:
+        constellation_id = constellation_ids[constel]
+        date_id = date_ids[date]
+
+        # insertion des used_* dans la bdd, ignorée si ils y sont déjà
+        used_bands.append(
+            (date_id, station_id, constellation_id, *(observation_ids[band] for band in used_mp + used_sig2noise))
         )
 
-        with cur.copy(
-            """--sql
-            copy tmp_skyplot (
-                datetime, date_id, station_id, constellation_id,
-                satellite, elevation, azimut,
-                mp1, mp2, mp5,
-                sig2noise1, sig2noise2, sig2noise5,
-                cs1, cs2, cs5
-            ) from stdin
-            with null as 'None'
-            """
-        ) as copy:
-            copy.write("\n".join(to_insert))
-
-        cur.execute(
-            """--sql
-            insert into skyplot
-            (
-                datetime, date_id, station_id, constellation_id,
-                satellite, elevation, azimut,
-                mp1, mp2, mp5,
-                sig2noise1, sig2noise2, sig2noise5,
-                cs1, cs2, cs5
-            )
-            (select 
-                datetime, date_id, station_id, constellation_id,
-                satellite, elevation, azimut,
-                mp1, mp2, mp5,
-                sig2noise1, sig2noise2, sig2noise5,
-                cs1, cs2, cs5
-            from tmp_skyplot)
+        # Les colonnes des valeurs, une colonne vide si la bande n'existe pas
+        empty = array("h", [MISSING]) * (len(block) * block.width)
+        columns = [block.ele, block.azi]
+        columns += [block.mp[band] if band else empty for band in used_mp]
+        columns += [block.sig2noise[band] if band else empty for band in used_sig2noise]
+
+        to_insert.append((block, (date, station_id, constellation_id), columns, used_mp))
+
+    if used_bands:
+        values = ",".join("(%s, %s, %s, %s, %s, %s, %s, %s, %s)" for _ in used_bands)
+        yield Execute(
+            f"""--sql
+            insert into skyplot_used_band
+                (
+                    date_id, station_id, constellation_id,
+                    mp1_observation_type_id,
+                    mp2_observation_type_id,
+                    mp5_observation_type_id,
+                    sig2noise1_observation_type_id,
+                    sig2noise2_observation_type_id,
+                    sig2noise5_observation_type_id
+                )
+            values {values}
             on conflict do nothing;
-            """
+            """,
+            [param for row in used_bands for param in row],
+        )
+
+    if raw and to_insert:
+        # Les blocs sont sérialisés un par un, pendant l'envoi, pour ne pas tout garder en mémoire
+        yield from staged_copy(
+            "skyplot",
+            _SKYPLOT_COLUMNS,
+            (_serialize_block(block, prefix, columns, cs_columns) for block, prefix, columns, cs_columns in to_insert),
+            SQL("do nothing"),
+        )
+
+    if rollup and to_insert:
+        yield from upsert_rows(
+            "skyplot_rollup",
+            _SKYPLOT_ROLLUP_COLUMNS,
+            _SKYPLOT_ROLLUP_TYPES,
+            (row for args in to_insert for row in _rollup_block(*args)),
+            _SKYPLOT_ROLLUP_KEY,
         )
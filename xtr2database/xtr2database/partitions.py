@@ -0,0 +1,157 @@
+"""
+MIT License
+
+Copyright (c) 2023 Raphaël Caldwell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import datetime as dt
+import re
+
+from psycopg.sql import SQL, Identifier, Literal
+
+from .extractors import get_xtr_file_date
+
+# Les partitions de la table skyplot couvrent un mois chacune
+_PARTITION_NAME = re.compile(r"^skyplot_y(\d{4})m(\d{2})$")
+
+
+def month_start(date):
+    return dt.date(date.year, date.month, 1)
+
+
+def next_month(month):
+    if month.month == 12:
+        return dt.date(month.year + 1, 1, 1)
+    return dt.date(month.year, month.month + 1, 1)
+
+
+def partition_name(month):
+    return f"skyplot_y{month.year:04}m{month.month:02}"
+
+
+def is_partitioned(cur):
+    """
+    Indique si la table skyplot est partitionnée (voir database/partition_skyplot.sql).
+    """
+    cur.execute("select exists (select from pg_partitioned_table where partrelid = 'skyplot'::regclass) as res;")
+    return cur.fetchone()["res"]
+
+
+def get_partitions(cur):
+    """
+    Renvoie les partitions mensuelles de la table skyplot, par mois, avec leur
+    nombre de sous-partitions par station (0 si il n'y en a pas).
+    """
+    cur.execute("""--sql
+        select c.relname as name, count(sub.inhrelid) as station_partitions
+        from pg_inherits i
+        inner join pg_class c on c.oid = i.inhrelid
+        left join pg_inherits sub on sub.inhparent = i.inhrelid
+        where i.inhparent = 'skyplot'::regclass
+        group by c.relname;
+        """)
+
+    partitions = {}
+    for r in cur:
+        match = _PARTITION_NAME.match(r["name"])
+        if match:
+            partitions[dt.date(int(match[1]), int(match[2]), 1)] = r["station_partitions"]
+
+    return partitions
+
+
+def create_partitions(cur, start, end, station_partitions=None):
+    """
+    Créer les partitions mensuelles manquantes de la table skyplot, du mois de
+    `start` à celui de `end` inclus. Renvoie les mois des partitions créées.
+
+    Avec `station_partitions`, chaque partition est découpée en autant de
+    sous-partitions par station. Par défaut, le découpage de la partition la plus
+    récente est repris.
+    """
+    partitions = get_partitions(cur)
+
+    if station_partitions is None:
+        station_partitions = partitions[max(partitions)] if partitions else 0
+
+    created = []
+    month = month_start(start)
+    while month <= end:
+        if month not in partitions:
+            _create_partition(cur, month, station_partitions)
+            created.append(month)
+
+        month = next_month(month)
+
+    return created
+
+
+def _create_partition(cur, month, station_partitions):
+    name = partition_name(month)
+
+    query = SQL("create table {} partition of skyplot for values from ({}) to ({})").format(
+        Identifier(name), Literal(month), Literal(next_month(month))
+    )
+    if station_partitions:
+        query += SQL(" partition by hash (station_id)")
+    cur.execute(query)
+
+    for remainder in range(station_partitions):
+        cur.execute(
+            SQL("create table {} partition of {} for values with (modulus {}, remainder {})").format(
+                Identifier(f"{name}_s{remainder}"), Identifier(name), Literal(station_partitions), Literal(remainder)
+            )
+        )
+
+
+def drop_partitions(cur, before):
+    """
+    Supprime les partitions de la table skyplot entièrement antérieures à `before`,
+    ainsi que les bandes utilisées correspondantes. Renvoie les mois supprimés.
+    """
+    dropped = sorted(month for month in get_partitions(cur) if next_month(month) <= before)
+
+    for month in dropped:
+        cur.execute(SQL("drop table {};").format(Identifier(partition_name(month))))
+
+    if dropped:
+        cur.execute(
+            """--sql
+            delete from skyplot_used_band
+            where date_id in (select id from skyplot_date where date < %s);
+            """,
+            (next_month(dropped[-1]),),
+        )
+
+    return dropped
+
+
+def ensure_partitions(cur, file_stems):
+    """
+    Créer, si la table skyplot est partitionnée, les partitions nécessaires à
+    l'importation des fichiers xtr donnés (par leur nom sans extension).
+    """
+    if not file_stems or not is_partitioned(cur):
+        return []
+
+    dates = [get_xtr_file_date(stem) for stem in file_stems]
+
+    # Les époques d'un fichier peuvent déborder sur les jours voisins
+    return create_partitions(cur, min(dates) - dt.timedelta(days=1), max(dates) + dt.timedelta(days=1))
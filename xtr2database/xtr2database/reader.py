@@ -0,0 +1,221 @@
+"""
+MIT License
+
+Copyright (c) 2023 Raphaël Caldwell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import mmap
+from enum import Enum
+from itertools import chain
+
+# Une implémentation plus rapide de zlib est utilisée si elle est installée
+try:
+    from isal import isal_zlib as zlib
+except ImportError:
+    try:
+        from zlib_ng import zlib_ng as zlib
+    except ImportError:
+        import zlib
+
+# Extensions des fichiers xtr, compressés ou non
+XTR_SUFFIXES = (".xtr", ".xtr.gz")
+
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+def xtr_suffix(gziped=False):
+    """
+    Renvoie la ou les extensions des fichiers xtr à traiter : seulement les fichiers
+    compressés avec `gziped`, sinon tous.
+    """
+    return ".xtr.gz" if gziped else XTR_SUFFIXES
+
+
+def unique_xtr_files(files):
+    """
+    Ne garde qu'un fichier par nom (sans extension) parmi des chemins de fichiers
+    xtr : si un jour existe compressé et non compressé, le fichier compressé est gardé.
+    """
+    unique = {}
+    for file in files:
+        file_stem = file.name.split(".", 1)[0]
+        if file_stem not in unique or file.name.endswith(".gz"):
+            unique[file_stem] = file
+
+    return list(unique.values())
+
+
+def gunzip(data):
+    """
+    Décompresse en une fois le contenu d'un fichier gzip, éventuellement formé de
+    plusieurs membres à la suite.
+    """
+    chunks = []
+    while data:
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        chunks.append(decompressor.decompress(data))
+        if not decompressor.eof:
+            raise EOFError("fichier gzip tronqué")
+
+        # membre suivant (en ignorant un éventuel remplissage)
+        data = decompressor.unused_data.lstrip(b"\x00")
+
+    return b"".join(chunks)
+
+
+class Section(Enum):
+    """
+    Les sections d'un fichier xtr utilisées par le script.
+    """
+
+    SUMMARY_STATISTICS = "Summary statistics"
+    ESTIMATED_VALUES = "Estimated values"
+    BAND_AVAILABLE = "Band available"
+    PREPROCESSING_RESULTS = "Preprocessing results"
+    ELEVATION_AZIMUTH = "Elevation & Azimuth"
+    CODE_MULTIPATH = "Code multipath"
+    SIGNAL_TO_NOISE = "Signal to noise ratio"
+
+
+_SECTION_MARK = "#====== "
+
+# Les 12 premiers caractères du titre suffisent à identifier une section
+_SECTION_KEY_LENGTH = 12
+_SECTIONS_BY_KEY = {section.value[:_SECTION_KEY_LENGTH]: section for section in Section}
+
+
+def index_sections(data):
+    """
+    Renvoie la position de la première ligne de chaque section utilisée, ainsi que
+    la position de la fin de cette section (le début de la suivante).
+
+    `data` peut être un texte, ou des octets (un fichier projeté en mémoire par
+    exemple) : les titres sont alors cherchés directement dans les octets.
+    """
+    if isinstance(data, str):
+        mark, newline = _SECTION_MARK, "\n"
+    else:
+        mark, newline = _SECTION_MARK.encode("ascii"), b"\n"
+
+    marks = []
+
+    start = 0 if data[: len(mark)] == mark else data.find(newline + mark)
+    while start != -1:
+        if data[start : start + 1] == newline:
+            start += 1
+
+        key_start = start + len(mark)
+        key = data[key_start : key_start + _SECTION_KEY_LENGTH]
+        if not isinstance(key, str):
+            key = key.decode("ascii", "replace")
+        marks.append((start, _SECTIONS_BY_KEY.get(key)))
+
+        start = data.find(newline + mark, start)
+
+    offsets = {}
+    for i, (start, section) in enumerate(marks):
+        if section is None or section in offsets:
+            continue
+
+        end = marks[i + 1][0] if i + 1 < len(marks) else len(data)
+        offsets[section] = (start, end)
+
+    return offsets
+
+
+def _iter_lines(data, start, crlf, binary):
+    """
+    Itère sur les lignes d'un contenu à partir d'une position, en octets ou décodées.
+    """
+    while start < len(data):
+        end = data.find(b"\n", start) + 1 or len(data)
+        line = data[start:end]
+        if crlf:
+            line = line.replace(b"\r\n", b"\n")
+        yield line if binary else line.decode("ascii")
+        start = end
+
+
+class XtrFile:
+    """
+    Un fichier xtr, dont les sections sont indexées en une passe sur son contenu
+    brut (des octets, projetés en mémoire pour les fichiers non compressés).
+
+    Seules les sections demandées sont lues et découpées en lignes, au moment où
+    elles sont lues. Les grandes sections (skyplots) peuvent être lues en octets,
+    sans décoder leurs lignes.
+    """
+
+    def __init__(self, data):
+        if isinstance(data, str):
+            data = data.encode("ascii")
+
+        self._data = data
+        self._offsets = index_sections(data)
+
+        # les fins de ligne d'un fichier sont toutes les mêmes, la première suffit
+        first_newline = data.find(b"\n")
+        self._crlf = first_newline > 0 and data[first_newline - 1 : first_newline] == b"\r"
+
+    @classmethod
+    def open(cls, path):
+        """
+        Ouvre un fichier xtr, compressé (gzip) ou non : la compression est détectée
+        à partir de son contenu. Un fichier compressé est lu et décompressé en une
+        fois, un fichier non compressé est projeté en mémoire (`mmap`) sans être copié.
+        """
+        with open(path, "rb") as f:
+            if f.read(len(_GZIP_MAGIC)) == _GZIP_MAGIC:
+                f.seek(0)
+                return cls(gunzip(f.read()))
+
+            try:
+                # la projection reste valide une fois le fichier fermé
+                return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            except ValueError:  # un fichier vide ne peut pas être projeté
+                return cls(b"")
+
+    def __contains__(self, section):
+        return section in self._offsets
+
+    def section(self, section, binary=False):
+        """
+        Renvoie un itérateur sur les lignes d'une section, qui suit celle de son titre.
+        Avec `binary`, les lignes sont des octets, que les extracteurs découpent et
+        convertissent sans les décoder.
+
+        Les extracteurs lisent parfois un peu plus loin que leur section, l'itérateur
+        continue donc sur la suite du fichier.
+
+        Comme à la lecture d'un fichier texte, les fins de ligne Windows (CRLF) sont
+        ramenées à un simple saut de ligne.
+        """
+        start, end = self._offsets[section]
+
+        content = self._data[start:end]
+        if self._crlf:
+            content = content.replace(b"\r\n", b"\n")
+        if not binary:
+            content = content.decode("ascii")
+
+        lines = iter(content.splitlines(keepends=True))
+        next(lines)  # titre de la section
+
+        return chain(lines, _iter_lines(self._data, end, self._crlf, binary))
@@ -0,0 +1,179 @@
+"""
+MIT License
+
+Copyright (c) 2023 Raphaël Caldwell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+from pathlib import Path
+
+# Les répertoires modifiés il y a moins longtemps que ça sont relus à la
+# prochaine exécution : des fichiers ont pu y être ajoutés sans changer leur
+# date de modification (selon la précision du système de fichiers)
+_RACY_DELAY = 2  # secondes
+
+
+def manifest_path(manifest_dir, root):
+    """
+    Renvoie le chemin du manifeste d'un répertoire racine.
+    """
+    digest = hashlib.sha1(os.path.abspath(root).encode()).hexdigest()
+    return Path(manifest_dir) / "manifests" / (digest + ".pickle")
+
+
+class DirectoryScanner:
+    """
+    Parcours récursif d'un répertoire, qui peut garder en mémoire (et sur disque)
+    le contenu de chaque répertoire rencontré avec sa date de modification.
+
+    Lors des parcours suivants, seuls les répertoires dont la date de modification
+    a changé sont relus, les autres sont seulement consultés avec `stat`. Le manifeste
+    n'est réécrit que si un parcours l'a modifié.
+    """
+
+    def __init__(self, root, manifest=None):
+        self.root = os.path.abspath(root)
+        self.manifest = manifest
+
+        #   répertoire -> (date de modification, sous-répertoires, fichiers)
+        self._directories = {}
+        self._dirty = False
+        if manifest is not None:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.manifest, "rb") as f:
+                self._directories = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self._directories = {}
+
+    def save(self):
+        """
+        Enregistre le manifeste sur disque, s'il a changé depuis son chargement ou
+        son dernier enregistrement.
+        """
+        if self.manifest is None or not self._dirty:
+            return
+
+        manifest = Path(self.manifest)
+        manifest.parent.mkdir(parents=True, exist_ok=True)
+
+        # un fichier temporaire propre à chaque écriture : deux parcours (dans deux
+        # threads par exemple) peuvent enregistrer le même manifeste en même temps
+        with tempfile.NamedTemporaryFile(
+            "wb", dir=manifest.parent, prefix=manifest.stem + ".", suffix=".tmp", delete=False
+        ) as f:
+            pickle.dump(self._directories, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(f.name, manifest)
+        self._dirty = False
+
+    def _read_directory(self, path):
+        subdirs = []
+        files = []
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir():
+                    subdirs.append(entry.name)
+                else:
+                    files.append(entry.name)
+
+        return subdirs, files
+
+    def scan(self):
+        """
+        Parcours le répertoire racine et renvoie, pour chaque répertoire, le nom des
+        fichiers qu'il contient.
+        """
+        racy_limit = time.time_ns() - _RACY_DELAY * 1_000_000_000
+
+        directories = {}
+        to_visit = [self.root]
+        while to_visit:
+            path = to_visit.pop()
+
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+
+            cached = self._directories.get(path)
+            if cached is not None and cached[0] is not None and cached[0] == mtime:
+                _, subdirs, files = cached
+            else:
+                try:
+                    subdirs, files = self._read_directory(path)
+                except OSError:
+                    continue
+                self._dirty = True
+
+            directories[path] = (mtime if mtime < racy_limit else None, subdirs, files)
+            to_visit.extend(os.path.join(path, subdir) for subdir in reversed(subdirs))
+
+        # sans répertoire relu, seule la disparition de répertoires change le manifeste
+        if len(directories) != len(self._directories):
+            self._dirty = True
+        self._directories = directories
+
+        for path, (_, _, files) in directories.items():
+            yield path, files
+
+    def iter_names(self, suffix):
+        """
+        Génère, au fur et à mesure du parcours, le répertoire et le nom de tout les
+        fichiers dont le nom finit par `suffix`. Le manifeste est mis à jour à la fin.
+        """
+        for path, names in self.scan():
+            for name in names:
+                if name.endswith(suffix):
+                    yield path, name
+
+        self.save()
+
+    def files(self, suffix):
+        """
+        Renvoie les chemins de tout les fichiers dont le nom finit par `suffix`, et
+        met à jour le manifeste.
+        """
+        return [Path(path, name) for path, name in self.iter_names(suffix)]
+
+
+def scan_files(root, suffix, manifest_dir=None):
+    """
+    Renvoie les chemins de tout les fichiers du répertoire `root` (récursivement)
+    dont le nom finit par `suffix`.
+
+    Si `manifest_dir` est donné, le contenu des répertoires y est gardé entre deux
+    exécutions et seuls les répertoires modifiés sont relus.
+    """
+    manifest = manifest_path(manifest_dir, root) if manifest_dir is not None else None
+    return DirectoryScanner(root, manifest).files(suffix)
+
+
+def get_manifest_dir(args):
+    """
+    Renvoie le répertoire des manifestes selon les arguments en ligne de commande,
+    None si le parcours incrémental n'est pas demandé.
+    """
+    return args.cache_dir if args.incremental_scan else None
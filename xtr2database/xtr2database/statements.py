@@ -0,0 +1,152 @@
+"""
+MIT License
+
+Copyright (c) 2023 Raphaël Caldwell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from psycopg.sql import SQL, Identifier
+
+
+class Execute:
+    """
+    Requête simple, avec ses paramètres.
+    """
+
+    __slots__ = ("query", "params")
+
+    def __init__(self, query, params=None):
+        self.query = query
+        self.params = params
+
+    def run(self, cur):
+        cur.execute(self.query, self.params)
+
+    async def run_async(self, cur):
+        await cur.execute(self.query, self.params)
+
+
+class Copy:
+    """
+    Envoi de données avec COPY. Avec `types`, `rows` contient des rangées au format
+    binaire, sinon des morceaux de texte déjà mis en forme.
+
+    `rows` n'est parcouru qu'une fois, pendant l'envoi : ce peut être un générateur.
+    """
+
+    __slots__ = ("query", "rows", "types")
+
+    def __init__(self, query, rows, types=None):
+        self.query = query
+        self.rows = rows
+        self.types = types
+
+    def run(self, cur):
+        with cur.copy(self.query) as copy:
+            if self.types is None:
+                for chunk in self.rows:
+                    copy.write(chunk)
+            else:
+                copy.set_types(self.types)
+                for row in self.rows:
+                    copy.write_row(row)
+
+    async def run_async(self, cur):
+        async with cur.copy(self.query) as copy:
+            if self.types is None:
+                for chunk in self.rows:
+                    await copy.write(chunk)
+            else:
+                copy.set_types(self.types)
+                for row in self.rows:
+                    await copy.write_row(row)
+
+
+def staged_copy(table, columns, rows, conflict, types=None):
+    """
+    Génère les requêtes d'envoi de rangées dans une table en passant par une table
+    temporaire, COPY ne supportant pas ON CONFLICT. `conflict` est la clause
+    suivant ON CONFLICT lors du transfert vers la table.
+
+    Sans `types`, `rows` contient des morceaux de texte au format de COPY.
+    """
+    tmp_table = Identifier(f"tmp_{table}")
+    columns = SQL(", ").join(map(Identifier, columns))
+
+    yield Execute(
+        SQL("create temporary table {} (like {} including defaults) on commit drop;").format(
+            tmp_table, Identifier(table)
+        )
+    )
+
+    if types is None:
+        yield Copy(SQL("copy {} ({}) from stdin").format(tmp_table, columns), rows)
+    else:
+        yield Copy(SQL("copy {} ({}) from stdin (format binary)").format(tmp_table, columns), rows, types)
+
+    # La table temporaire est supprimée tout de suite pour pouvoir être recréée
+    # dans la même transaction
+    yield Execute(
+        SQL(
+            "insert into {table} ({columns}) select {columns} from {tmp_table} on conflict {conflict}; "
+            "drop table {tmp_table};"
+        ).format(table=Identifier(table), columns=columns, tmp_table=tmp_table, conflict=conflict)
+    )
+
+
+def upsert_rows(table, columns, types, rows, key_columns):
+    """
+    Génère les requêtes d'envoi de rangées dans une table, au format binaire : les
+    rangées dont la clé (`key_columns`) existe déjà remplacent les anciennes.
+
+    Si plusieurs rangées ont la même clé, seule la dernière est gardée.
+    """
+    key_indexes = [columns.index(column) for column in key_columns]
+    unique_rows = {tuple(row[i] for i in key_indexes): row for row in rows}
+
+    conflict = SQL("({}) do update set {}").format(
+        SQL(", ").join(map(Identifier, key_columns)),
+        SQL(", ").join(
+            SQL("{0} = excluded.{0}").format(Identifier(column)) for column in columns if column not in key_columns
+        ),
+    )
+
+    yield from staged_copy(table, columns, unique_rows.values(), conflict, types)
+
+
+def run_statements(cur, statements):
+    """
+    Execute les requêtes générées par `statements`, une par une.
+
+    Le générateur n'est repris qu'une fois la requête précédente terminée : il peut
+    donc utiliser le même curseur entre deux requêtes (pour récupérer des IDs).
+    """
+    for statement in statements:
+        statement.run(cur)
+
+
+async def run_statements_async(cur, statements):
+    """
+    Comme `run_statements`, avec un curseur asynchrone.
+
+    Le générateur ne doit alors pas utiliser le curseur lui-même : les IDs doivent
+    être récupérés par un `DatabaseFetcher` avec sa propre connexion.
+    """
+    for statement in statements:
+        await statement.run_async(cur)
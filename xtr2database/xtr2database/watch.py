@@ -0,0 +1,217 @@
+"""
+MIT License
+
+Copyright (c) 2023 Raphaël Caldwell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import sys
+import time
+import traceback
+from itertools import groupby
+
+from psycopg import OperationalError
+
+from .database import DatabaseFetcher
+from .extractors import get_xtr_file_stem_station_id
+from .partitions import ensure_partitions
+from .reader import unique_xtr_files, xtr_suffix
+from .scanner import DirectoryScanner, get_manifest_dir, manifest_path
+from .xtr_import import batched, get_inserted_files, get_station_data, insert_into_database
+
+DEFAULT_INTERVAL = 10  # secondes
+DEFAULT_SETTLE = 30  # secondes
+
+
+class PendingFiles:
+    """
+    Suivi des nouveaux fichiers jusqu'à ce qu'ils soient complets.
+
+    Un fichier est considéré complet lorsque sa taille et sa date de modification
+    n'ont pas changées entre deux passages, et qu'il n'a pas été modifié depuis
+    `settle` secondes.
+    """
+
+    def __init__(self, settle=DEFAULT_SETTLE):
+        self.settle = settle
+        self._seen = {}
+
+    def ready(self, files, now=None):
+        """
+        Renvoie parmis `files` ceux qui sont complets. Les fichiers qui ne sont
+        plus présents sont oubliés.
+        """
+        if now is None:
+            now = time.time()
+
+        seen = {}
+        ready = []
+        for file in files:
+            try:
+                stat = os.stat(file)
+            except OSError:
+                continue
+
+            state = (stat.st_size, stat.st_mtime)
+            if self._seen.get(file) == state and now - stat.st_mtime >= self.settle:
+                ready.append(file)
+            else:
+                seen[file] = state
+
+        self._seen = seen
+        return ready
+
+
+class Watcher:
+    """
+    Importe les fichiers xtr d'un réseau au fur et à mesure de leur apparition.
+
+    La liste des fichiers insérés n'est récupérée qu'une fois, et la connexion à la
+    base de données est reprise du pool à chaque passage (une connexion rompue est
+    remplacée par le pool).
+    """
+
+    def __init__(self, args, db_connection):
+        self.args = args
+        self.db_connection = db_connection
+        self.suffix = xtr_suffix(args.gziped)
+
+        manifest_dir = get_manifest_dir(args)
+        manifest = manifest_path(manifest_dir, args.xtr_files) if manifest_dir is not None else None
+        self.scanner = DirectoryScanner(args.xtr_files, manifest)
+
+        self.pending = PendingFiles(args.settle)
+
+        self.inserted_files = None
+
+        # fichiers en erreur, réessayés seulement si ils changent
+        self._failed = {}
+
+    def _new_files(self):
+        """
+        Renvoie les fichiers qui ne sont pas encore insérés.
+        """
+        new_files = []
+        for file in unique_xtr_files(self.scanner.files(self.suffix)):
+            file_stem = file.name.split(".", 1)[0]
+            station = get_xtr_file_stem_station_id(file_stem)
+
+            if file_stem in self.inserted_files[station]:
+                continue
+
+            file = str(file)
+            failed = self._failed.get(file)
+            if failed is not None:
+                try:
+                    if failed == os.stat(file).st_mtime:
+                        continue
+                except OSError:
+                    continue
+
+            new_files.append(file)
+
+        return new_files
+
+    def _import_station(self, conn, fetcher, station_fullname, files):
+        """
+        Importe les fichiers d'une station un par un, chacun validé séparément : un
+        fichier en erreur est annulé seul, sans bloquer les autres.
+
+        Une connexion perdue n'est pas une erreur du fichier : l'exception remonte pour
+        abandonner le passage, et le fichier est réessayé au suivant.
+        """
+        imported = 0
+        for batch in batched(files, 1):
+            try:
+                station_data = get_station_data(batch, self.args.metrics)
+
+                with conn.cursor() as cur:
+                    insert_into_database(
+                        cur, fetcher, station_data, station_fullname, self.args.network, self.args.metrics
+                    )
+                conn.commit()
+            except OperationalError:
+                raise
+            except Exception:
+                if conn.closed:
+                    raise
+                conn.rollback()
+
+                print("Erreur lors du traitement du fichier", batch[0], file=sys.stderr)
+                traceback.print_exc(file=sys.stderr)
+                print(file=sys.stderr)
+
+                try:
+                    self._failed[batch[0]] = os.stat(batch[0]).st_mtime
+                except OSError:
+                    pass
+                continue
+
+            self.inserted_files[station_fullname].update(station_data[3])
+            imported += 1
+
+        print(f"{station_fullname} : {imported} fichier(s) importé(s).")
+
+    def poll(self):
+        """
+        Importe les nouveaux fichiers complets. Renvoie le nombre de fichiers traités.
+        """
+        # les IDs sont créés sur leur propre connexion : une station annulée ne laisse
+        # pas dans le cache des IDs qui n'existent pas dans la base
+        with self.db_connection() as conn, self.db_connection() as fetch_conn:
+            fetcher = DatabaseFetcher(connection=fetch_conn)
+            if self.inserted_files is None:
+                with conn.cursor() as cur:
+                    fetcher.preload(cur)
+                    self.inserted_files = get_inserted_files(cur, self.args.network)
+                conn.commit()
+
+            ready = self.pending.ready(self._new_files())
+            ready.sort(key=lambda f: os.path.basename(f))
+
+            if ready:
+                with conn.cursor() as cur:
+                    ensure_partitions(cur, [os.path.basename(f).split(".", 1)[0] for f in ready])
+                conn.commit()
+
+            for station_fullname, files in groupby(ready, lambda f: get_xtr_file_stem_station_id(os.path.basename(f))):
+                self._import_station(conn, fetcher, station_fullname, list(files))
+
+        return len(ready)
+
+    def run(self):
+        print(f"Surveillance de {self.args.xtr_files} (toutes les {self.args.interval} secondes)...")
+        try:
+            while True:
+                try:
+                    self.poll()
+                except Exception:
+                    # on garde la main, le fichier sera réessayé au prochain passage
+                    print("Erreur lors de la surveillance des fichiers", file=sys.stderr)
+                    traceback.print_exc(file=sys.stderr)
+                    print(file=sys.stderr)
+
+                time.sleep(self.args.interval)
+        except KeyboardInterrupt:
+            print("Arrêt de la surveillance.")
+
+
+def watch(args, db_connection):
+    Watcher(args, db_connection).run()
@@ -21,23 +21,121 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
+import asyncio
 import os
 import sys
 import traceback
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from functools import partial
-from gzip import open as gopen
-from itertools import groupby
-from multiprocessing import Manager
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import groupby, islice
 
 from tqdm import tqdm
 
+from .cache import ParseCache
 from .database import DatabaseFetcher, clear_tables
-from .extractors import get_xtr_file_date, get_station_coords, get_xtr_station_id
-from .metrics import TimeSeries, common, create_metric_dest, cycle_slip, extract_from_section_header_into, skyplot
+from .extractors import get_xtr_file_date, get_xtr_file_stem_station_id, get_station_coords, get_xtr_station_id
+from .metrics import (
+    DEFAULT_METRICS,
+    SKYPLOT,
+    SKYPLOT_ROLLUP,
+    TimeSeries,
+    common,
+    create_metric_dest,
+    cycle_slip,
+    extract_from_section_header_into,
+    skyplot,
+)
+from .partitions import ensure_partitions, partition_name
+from .reader import Section, XtrFile, unique_xtr_files, xtr_suffix
+from .scanner import get_manifest_dir, scan_files
+from .statements import Execute, run_statements, run_statements_async
+
+DEFAULT_WRITERS = 4
+DEFAULT_BATCH_SIZE = 1
+
+
+def _create_dests(metrics):
+    """
+    Crée les destinations des métriques demandées, None pour les autres.
+    """
+
+    def dest_if_wanted(metric_type):
+        return create_metric_dest(metric_type) if metric_type.value in metrics else None
+
+    time_series = (
+        dest_if_wanted(TimeSeries.SIG2NOISE),
+        dest_if_wanted(TimeSeries.MULTIPATH),
+        dest_if_wanted(TimeSeries.OBSERVATION_CS),
+        dest_if_wanted(TimeSeries.SATELLITE_CS),
+    )
+    # le skyplot agrégé est calculé à partir des mêmes données
+    skyplot_data = skyplot.create_dest() if SKYPLOT in metrics or SKYPLOT_ROLLUP in metrics else None
 
+    return time_series, skyplot_data
 
-def get_station_data(files, gziped=False):
+
+def get_file_data(file, metrics=None):
+    """
+    Extrait les données d'un fichier xtr, sous la même forme que `get_station_data`.
+    """
+    if metrics is None:
+        metrics = DEFAULT_METRICS
+
+    (sig2noise_data, multipath_data, observation_cs, satellite_cs), skyplot_data = _create_dests(metrics)
+
+    station_coords = (None, None)
+
+    filename = os.path.basename(file).split(".", 1)[0]
+    current_date = get_xtr_file_date(filename)
+
+    # la compression est détectée pour chaque fichier
+    xtr = XtrFile.open(file)
+
+    # extract_from_prepro_res et extract_from_band_avail ont besoin de savoir
+    #   cb ya de constellation au total dans le fichier (pour
+    #   marquer clairement à 0 les absences de CS et eviter les décalages)
+    # on initialisa a None pour clairement afficher un état illégal
+    nb_constell = None
+
+    if (observation_cs is not None or satellite_cs is not None) and Section.SUMMARY_STATISTICS in xtr:
+        f = xtr.section(Section.SUMMARY_STATISTICS)
+        nb_constell = cycle_slip.extract_from_sum_stats(f, observation_cs, satellite_cs, current_date)
+
+    if Section.ESTIMATED_VALUES in xtr:
+        station_coords = get_station_coords(xtr.section(Section.ESTIMATED_VALUES))
+
+    if satellite_cs is not None and Section.BAND_AVAILABLE in xtr:
+        cycle_slip.extract_from_band_avail(xtr.section(Section.BAND_AVAILABLE), satellite_cs, nb_constell)
+
+    if (satellite_cs is not None or skyplot_data is not None) and Section.PREPROCESSING_RESULTS in xtr:
+        f = xtr.section(Section.PREPROCESSING_RESULTS)
+        cycle_slip.extract_from_prepro_res(f, satellite_cs, skyplot_data, nb_constell, current_date)
+
+    if skyplot_data is not None and Section.ELEVATION_AZIMUTH in xtr:
+        f = xtr.section(Section.ELEVATION_AZIMUTH, binary=True)
+        skyplot.extract_elevation_azimut(f, skyplot_data, current_date)
+
+    if (multipath_data is not None or skyplot_data is not None) and Section.CODE_MULTIPATH in xtr:
+        f = xtr.section(Section.CODE_MULTIPATH, binary=True)
+        if extract_from_section_header_into(f, multipath_data, current_date) and skyplot_data is not None:
+            skyplot.extract_multipath(f, skyplot_data, current_date)
+
+    if (sig2noise_data is not None or skyplot_data is not None) and Section.SIGNAL_TO_NOISE in xtr:
+        f = xtr.section(Section.SIGNAL_TO_NOISE, binary=True)
+        if extract_from_section_header_into(f, sig2noise_data, current_date) and skyplot_data is not None:
+            skyplot.extract_sig2noise(f, skyplot_data, current_date)
+
+    time_series = (sig2noise_data, multipath_data, observation_cs, satellite_cs)
+
+    return (
+        tuple(time_serie for time_serie in time_series if time_serie is not None),
+        skyplot_data,
+        station_coords,
+        [filename],
+    )
+
+
+def get_station_data(files, metrics=None, cache=None):
     """
     Extrait les données d'une station et les met en forme pour l'insertion dans
     une bdd de type relationelle.
@@ -50,82 +148,63 @@ def get_station_data(files, gziped=False):
         - Skyplots
         - Les coordonées de la station
         - La liste des fichiers traités
-    """
-    sig2noise_data = create_metric_dest(TimeSeries.SIG2NOISE)
-    multipath_data = create_metric_dest(TimeSeries.MULTIPATH)
 
-    observation_cs = create_metric_dest(TimeSeries.OBSERVATION_CS)
-    satellite_cs = create_metric_dest(TimeSeries.SATELLITE_CS)
+    `metrics` permet de choisir les métriques extraites (voir `METRICS`), toutes sauf
+    le skyplot agrégé par défaut. Les sections des fichiers dont aucune métrique
+    demandée n'a besoin ne sont pas lues. Les séries temporelles non demandées sont
+    absentes du résultat, et le skyplot vaut None s'il n'est pas demandé.
+
+    Les fichiers peuvent être compressés (gzip) ou non, indépendamment les uns des autres.
+
+    Si un cache (`ParseCache`) est donné, les fichiers déjà lus y sont récupérés.
+    """
+    if metrics is None:
+        metrics = DEFAULT_METRICS
 
-    skyplot_data = skyplot.create_dest()
+    time_series, skyplot_data = _create_dests(metrics)
+    time_series = tuple(time_serie for time_serie in time_series if time_serie is not None)
 
     station_coords = (None, None)
 
     inserted_files = []
 
-    opener = partial(gopen, mode="rt") if gziped else partial(open, mode="r")
-
     # Extraction des informations des fichiers
     for file in files:
-        filename = file.split(".")[-3 if gziped else -2].rpartition(os.sep)[-1]
-        current_date = get_xtr_file_date(filename)
-
-        parsed_sections = 0
-        with opener(file, encoding="ascii") as f:  # l'encodage ascii est le plus rapide
-            # extract_from_prepro_res et extract_from_band_avail ont besoin de savoir
-            #   cb ya de constellation au total dans le fichier (pour
-            #   marquer clairement à 0 les absences de CS et eviter les décalages)
-            # on initialisa a None pour clairement afficher un état illégal
-            nb_constell = None
-            for line in f:
-                if parsed_sections == 7:
-                    break
-
-                elif line.startswith("#====== Summary statistics"):  # type: ignore
-                    nb_constell = cycle_slip.extract_from_sum_stats(f, observation_cs, satellite_cs, current_date)
-                    parsed_sections += 1
-
-                elif line.startswith("#====== Estimated values"):  # type: ignore
-                    if station_coords[0] is None:
-                        station_coords = get_station_coords(f)
-                    parsed_sections += 1
+        file_data = cache.get(file, metrics) if cache is not None else None
+        if file_data is None:
+            file_data = get_file_data(file, metrics)
+            if cache is not None:
+                cache.put(file, metrics, file_data)
 
-                elif line.startswith("#====== Band available"):  # type: ignore
-                    cycle_slip.extract_from_band_avail(f, satellite_cs, nb_constell)
-                    parsed_sections += 1
+        file_time_series, file_skyplot_data, file_coords, file_names = file_data
 
-                elif line.startswith("#====== Preprocessing results"):  # type: ignore
-                    cycle_slip.extract_from_prepro_res(f, satellite_cs, skyplot_data, nb_constell, current_date)
-                    parsed_sections += 1
+        for time_serie, file_time_serie in zip(time_series, file_time_series):
+            time_serie["length"] += file_time_serie["length"]
+            for column, values in file_time_serie["data"].items():
+                time_serie["data"][column].extend(values)
 
-                elif line.startswith("#====== Elevation & Azimuth"):  # type: ignore
-                    skyplot.extract_elevation_azimut(f, skyplot_data, current_date)
-                    parsed_sections += 1
+        if skyplot_data is not None:
+            for constel, days in file_skyplot_data.items():
+                skyplot_data[constel].update(days)
 
-                elif line.startswith("#====== Code multipath"):  # type: ignore
-                    if extract_from_section_header_into(f, multipath_data, current_date):
-                        skyplot.extract_multipath(f, skyplot_data, current_date)
-                    parsed_sections += 1
+        if station_coords[0] is None:
+            station_coords = file_coords
 
-                elif line.startswith("#====== Signal to noise ratio"):  # type: ignore
-                    if extract_from_section_header_into(f, sig2noise_data, current_date):
-                        skyplot.extract_sig2noise(f, skyplot_data, current_date)
-                    parsed_sections += 1
+        inserted_files.extend(file_names)
 
-        inserted_files.append(filename)
-
-    return (
-        (sig2noise_data, multipath_data, observation_cs, satellite_cs),
-        skyplot_data,
-        station_coords,
-        inserted_files,
-    )
+    return time_series, skyplot_data, station_coords, inserted_files
 
 
-def insert_into_database(cur, fetcher, data, station_fullname, station_network_name):
+def station_statements(cur, fetcher, data, station_fullname, station_network_name, metrics=None):
     """
-    Insère toute les données d'une station dans la base de données.
+    Génère les requêtes d'insertion de toute les données d'une station.
+
+    Les IDs sont récupérés par `fetcher` au fur et à mesure, avec `cur` (voir
+    `run_statements`). `metrics` indique si le skyplot est inséré tel quel et/ou
+    agrégé (voir `get_station_data`).
     """
+    if metrics is None:
+        metrics = DEFAULT_METRICS
 
     # lien avec le réseau
     network_id = fetcher.get_network_id(cur, station_network_name)
@@ -138,92 +217,380 @@ def insert_into_database(cur, fetcher, data, station_fullname, station_network_n
     # Insertion des données de la station
     for time_serie in data[0]:  # en premier les séries temporelles
         if time_serie["type"] == TimeSeries.OBSERVATION_CS.value:
-            cycle_slip.insert_observation(cur, fetcher, station_id, time_serie)
+            yield from cycle_slip.insert_observation(cur, fetcher, station_id, time_serie)
 
         elif time_serie["type"] == TimeSeries.SATELLITE_CS.value:
-            cycle_slip.insert_satellite(cur, fetcher, station_id, time_serie)
+            yield from cycle_slip.insert_satellite(cur, fetcher, station_id, time_serie)
 
         else:
-            common.insert_header_section_metric(cur, fetcher, station_id, time_serie)
+            yield from common.insert_header_section_metric(cur, fetcher, station_id, time_serie)
 
     # ensuite le skyplot (pas de boucle comme y'en a un seul)
-    skyplot.insert(cur, fetcher, station_id, data[1])
+    if data[1] is not None:
+        yield from skyplot.insert(
+            cur, fetcher, station_id, data[1], raw=SKYPLOT in metrics, rollup=SKYPLOT_ROLLUP in metrics
+        )
 
     # On note les fichiers traités
-    to_insert = ",".join(cur.mogrify("(%s,%s)", (f, station_id)) for f in data[3])
-    cur.execute(
+    values = ",".join("(%s,%s)" for _ in data[3])
+    yield Execute(
         f"""--sql
         insert into inserted_file (name, station_id)
-        values {to_insert};
-        """
+        values {values};
+        """,
+        [param for f in data[3] for param in (f, station_id)],
     )
 
 
-def get_all_files(infiles, blacklist=None, *, gziped=False):
+def insert_into_database(cur, fetcher, data, station_fullname, station_network_name, metrics=None):
+    """
+    Insère toute les données d'une station dans la base de données.
+    """
+    run_statements(cur, station_statements(cur, fetcher, data, station_fullname, station_network_name, metrics))
+
+
+def get_all_files(infiles, blacklist=None, *, gziped=False, watermarks=None, manifest_dir=None):
     """
-    Renvoie la liste de tout les fichiers qui doivent êtres traités.
-    On peut les filtrer pour en blacklister certains.
+    Renvoie la liste de tout les fichiers qui doivent êtres traités, triés par
+    station puis par date.
+
+    On peut les filtrer pour en blacklister certains : `blacklist` associe à chaque
+    station l'ensemble des noms de fichiers (sans extension) à ignorer. `watermarks`
+    associe à chaque station le nom du fichier le plus récent déjà traité, seuls les
+    fichiers plus récents sont alors gardés.
+
+    Avec `gziped`, seuls les fichiers compressés (.xtr.gz) sont gardés, sinon les
+    fichiers compressés ou non le sont (le fichier compressé si un jour existe sous
+    les deux formes).
+
+    Avec `manifest_dir`, le parcours de `infiles` est incrémental (voir `scan_files`).
     """
     if blacklist is None:
-        blacklist = []
+        blacklist = {}
+
+    if watermarks is None:
+        watermarks = {}
+
+    suffix = xtr_suffix(gziped)
+
+    flattened = []
+    for f in unique_xtr_files(scan_files(infiles, suffix, manifest_dir)):
+        file_stem = f.name.split(".", 1)[0]
+        station = get_xtr_file_stem_station_id(file_stem)
 
-    pattern = "*.xtr.gz" if gziped else "*.xtr"
+        if file_stem in blacklist.get(station, ()):
+            continue
 
-    flattened = [f for f in infiles.rglob(pattern) if str(f.name).split(".")[0] not in blacklist]
-    flattened.sort(key=get_xtr_station_id)
+        # les noms des fichiers d'une station se trient par date
+        watermark = watermarks.get(station)
+        if watermark is not None and file_stem <= watermark:
+            continue
+
+        flattened.append(f)
+
+    flattened.sort(key=lambda f: f.name)
 
     return flattened
 
 
-def process_station(db_connection, station_fullname, station_files, station_network_name, *, lock=None, gziped=False):
+def batched(station_files, batch_size=None):
+    """
+    Découpe la liste des fichiers d'une station en lots d'au plus `batch_size`
+    fichiers. Sans taille, la station entière forme un seul lot.
+    """
+    if not batch_size:
+        return [station_files]
+
+    return [station_files[i : i + batch_size] for i in range(0, len(station_files), batch_size)]
+
+
+def process_station(
+    db_connection,
+    fetcher,
+    station_fullname,
+    station_files,
+    station_network_name,
+    *,
+    batch_size=DEFAULT_BATCH_SIZE,
+    metrics=None,
+    cache=None,
+):
     """
     Extrait les données d'une sation et les insère dans la base de données.
     Les noms des fichiers doivent être des chaines de caractère
+
+    Les fichiers sont traités par lots de `batch_size` : chaque lot est lu, inséré
+    et validé, avec ses lignes de `inserted_file`, avant de passer au suivant. Un
+    lot en erreur est annulé et la station s'arrête là : les lots validés se suivent
+    toujours depuis le début, une importation interrompue ou en erreur reprend donc
+    (même avec `--newer-only`) au premier fichier non validé.
+
+    `fetcher` doit avoir sa propre connexion, pour que les objets qu'il crée ne
+    soient pas annulés avec un lot en erreur.
+    """
+    try:
+        with db_connection() as conn:
+            for batch in batched(station_files, batch_size):
+                try:
+                    station_data = get_station_data(batch, metrics, cache)
+
+                    with conn.cursor() as cur:
+                        insert_into_database(
+                            cur, fetcher, station_data, station_fullname, station_network_name, metrics
+                        )
+                    conn.commit()
+
+                    del station_data
+                except Exception:
+                    conn.rollback()
+
+                    print(
+                        "Erreur lors du traitement de la station",
+                        station_fullname,
+                        f"(fichiers {os.path.basename(batch[0])} à {os.path.basename(batch[-1])})",
+                        file=sys.stderr,
+                    )
+                    traceback.print_exc(file=sys.stderr)
+                    print("Les fichiers suivants de la station ne sont pas traités.", file=sys.stderr)
+                    print(file=sys.stderr)
+                    break
+    except Exception:
+        print("Erreur lors du traitement de la station", station_fullname, file=sys.stderr)
+        traceback.print_exc(file=sys.stderr)
+        print(file=sys.stderr)
+
+
+def parse_station(station_files, metrics=None, cache=None):
+    """
+    Extrait les données d'une station, à executer dans un processus fils.
+    Renvoie les données extraites, ou la trace de l'erreur rencontrée.
     """
     try:
-        station_data = get_station_data(station_files, gziped)
+        return get_station_data(station_files, metrics, cache), None
+    except Exception:
+        return None, traceback.format_exc()
 
+
+def write_station(db_connection, fetcher, station_data, station_fullname, station_network_name, metrics=None):
+    """
+    Insère les données extraites d'une station, à executer dans un thread d'écriture.
+    Renvoie la trace de l'erreur rencontrée si il y en a une.
+    """
+    try:
         with db_connection() as conn:
             with conn.cursor() as cur:
-                insert_into_database(cur, DatabaseFetcher(lock), station_data, station_fullname, station_network_name)
+                insert_into_database(cur, fetcher, station_data, station_fullname, station_network_name, metrics)
     except Exception:
-        if lock is None:
-            print("Erreur lors du traitement de la station", station_fullname, file=sys.stderr)
-            traceback.print_exc(file=sys.stderr)
-            print(file=sys.stderr)
-        else:
-            with open("concurent-errors.log", "a") as f:
-                f.write(f"Erreur lors du traitement de la station {station_fullname}\n")
-                traceback.print_exc(file=f)
-                f.write("\n")
+        return traceback.format_exc()
 
+    return None
 
-def process_sequencial(db_connection, stations, network, gziped=False):
+
+async def write_station_async(pool, fetcher, station_data, station_fullname, station_network_name, metrics=None):
+    """
+    Insère les données extraites d'une station avec une connexion asynchrone du pool.
+    Renvoie la trace de l'erreur rencontrée si il y en a une.
+
+    `fetcher` doit avoir sa propre connexion, les IDs ne pouvant pas être récupérés
+    avec le curseur asynchrone.
+    """
+    try:
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await run_statements_async(
+                    cur,
+                    station_statements(None, fetcher, station_data, station_fullname, station_network_name, metrics),
+                )
+    except Exception:
+        return traceback.format_exc()
+
+    return None
+
+
+def process_sequencial(db_connection, stations, network, batch_size=DEFAULT_BATCH_SIZE, metrics=None, cache=None):
     print("Traitement des stations en séquenciel...")
 
-    for name, files in tqdm(stations):
-        process_station(db_connection, name, files, network, gziped=gziped)
+    with db_connection() as fetch_conn:
+        fetcher = DatabaseFetcher(connection=fetch_conn)
+
+        for name, files in tqdm(stations):
+            process_station(
+                db_connection,
+                fetcher,
+                name,
+                files,
+                network,
+                batch_size=batch_size,
+                metrics=metrics,
+                cache=cache,
+            )
+
+
+def process_parallel(
+    db_connection,
+    stations,
+    network,
+    workers=None,
+    writers=DEFAULT_WRITERS,
+    batch_size=DEFAULT_BATCH_SIZE,
+    metrics=None,
+    cache=None,
+):
+    """
+    Traite les stations en parallèle : les fichiers sont lus par `workers` processus
+    et les données sont insérées par au plus `writers` connexions simultanées.
+    Chaque lot de `batch_size` fichiers d'une station est lu et inséré séparément.
+
+    La progression (en fichiers) est rapportée dans l'ordre des stations. Renvoie
+    les erreurs rencontrées, par station.
+    """
+    workers = workers or os.cpu_count() or 1
+    print(f"Traitement des stations en parallèle ({workers} processus, {writers} connexions)...")
+
+    errors = {}
+    total = sum(len(files) for _, files in stations)
+    batches = ((name, batch) for name, files in stations for batch in batched(files, batch_size))
+
+    # Files d'attente des lots en cours de lecture puis d'insertion, bornées
+    # pour limiter la mémoire occupée par les données extraites
+    parsing = deque()
+    writing = deque()
+
+    with db_connection() as fetch_conn, tqdm(total=total) as pbar:
+        # Les objets partagés (réseau, stations, ...) sont créés sur une connexion
+        # à part pour être visibles tout de suite par toutes les connexions d'écriture
+        fetcher = DatabaseFetcher(connection=fetch_conn)
+
+        with ProcessPoolExecutor(workers) as parsers, ThreadPoolExecutor(writers) as writers_pool:
+            for name, files in islice(batches, 2 * workers):
+                parsing.append((name, len(files), parsers.submit(parse_station, files, metrics, cache)))
+
+            while parsing or writing:
+                if parsing and len(writing) < 2 * writers:
+                    name, nb_files, future = parsing.popleft()
+                    station_data, error = future.result()
+
+                    for next_name, next_files in islice(batches, 1):
+                        future = parsers.submit(parse_station, next_files, metrics, cache)
+                        parsing.append((next_name, len(next_files), future))
+
+                    if error is None:
+                        future = writers_pool.submit(
+                            write_station, db_connection, fetcher, station_data, name, network, metrics
+                        )
+                    else:
+                        future = None
+                    writing.append((name, nb_files, future, error))
+
+                    continue
+
+                # On attend le plus ancien lot en cours d'insertion
+                name, nb_files, future, error = writing.popleft()
+                if future is not None:
+                    error = future.result()
+
+                if error is not None:
+                    errors.setdefault(name, []).append(error)
+
+                pbar.set_postfix_str(name)
+                pbar.update(nb_files)
+
+    return errors
+
+
+def process_async(
+    db_connection,
+    async_pool,
+    stations,
+    network,
+    workers=None,
+    writers=DEFAULT_WRITERS,
+    batch_size=DEFAULT_BATCH_SIZE,
+    metrics=None,
+    cache=None,
+):
+    """
+    Traite les stations en parallèle, avec des insertions asynchrones : les fichiers
+    sont lus par `workers` processus pendant que `writers` connexions asynchrones
+    (créées par `async_pool`) envoient les données des lots déjà lus.
+
+    Contrairement à `process_parallel`, les lots sont insérés dans l'ordre où leur
+    lecture se termine. Renvoie les erreurs rencontrées, par station.
+    """
+    workers = workers or os.cpu_count() or 1
+    print(f"Traitement des stations en asynchrone ({workers} processus, {writers} connexions)...")
+
+    total = sum(len(files) for _, files in stations)
+    batches = ((name, batch) for name, files in stations for batch in batched(files, batch_size))
+
+    with db_connection() as fetch_conn, tqdm(total=total) as pbar, ProcessPoolExecutor(workers) as parsers:
+        # Les IDs sont récupérés avec une connexion classique, partagée par toutes
+        # les connexions asynchrones
+        fetcher = DatabaseFetcher(connection=fetch_conn)
+
+        async def ingest():
+            loop = asyncio.get_event_loop()
+            errors = {}
+
+            # Lots lus en attente d'insertion, bornée pour limiter la mémoire occupée
+            parsed = asyncio.Queue(2 * writers)
+
+            async def parse(name, files):
+                result = await loop.run_in_executor(parsers, parse_station, files, metrics, cache)
+                await parsed.put((name, len(files), *result))
 
+            async def read_batches():
+                pending = set()
+                for name, files in batches:
+                    if len(pending) >= 2 * workers:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            task.result()
+                    pending.add(loop.create_task(parse(name, files)))
 
-def process_parallel(db_connection, stations, network, gziped):
-    print("Traitement des stations en paralèlle...")
-    manager = Manager()
-    lock = manager.Lock()
+                for task in pending:
+                    await task
 
-    with tqdm(total=len(stations)) as pbar:
-        # On traite la première station toute seule pour limiter les conditions de concurence
-        first = stations.pop(0)
-        process_station(db_connection, first[0], first[1], network)
-        pbar.update(1)
+                # Signal de fin pour chaque connexion
+                for _ in range(writers):
+                    await parsed.put(None)
 
-        with ProcessPoolExecutor() as executor:
-            # NOTE : ne pas oublier de mettre a jour en fonction de la signature de process_station
-            futures = [
-                executor.submit(process_station, name, files, network, dict(lock=lock, gziped=gziped))
-                for name, files in stations
-            ]
-            for _ in as_completed(futures):
-                pbar.update(1)
+            async def write_batches(pool):
+                while True:
+                    item = await parsed.get()
+                    if item is None:
+                        return
+
+                    name, nb_files, station_data, error = item
+                    if error is None:
+                        error = await write_station_async(pool, fetcher, station_data, name, network, metrics)
+                    del station_data
+
+                    if error is not None:
+                        errors.setdefault(name, []).append(error)
+
+                    pbar.set_postfix_str(name)
+                    pbar.update(nb_files)
+
+            async with async_pool() as pool:
+                await asyncio.gather(read_batches(), *(write_batches(pool) for _ in range(writers)))
+
+            return errors
+
+        return asyncio.run(ingest())
+
+
+def report_errors(errors):
+    """
+    Affiche les erreurs rencontrées lors du traitement des stations.
+    """
+    for station_fullname, station_errors in errors.items():
+        for error in station_errors:
+            print("Erreur lors du traitement de la station", station_fullname, file=sys.stderr)
+            print(error, file=sys.stderr)
+
+    if errors:
+        print(len(errors), "stations n'ont pas pu être traitées.", file=sys.stderr)
 
 
 def override_insert(cur, args):
@@ -234,42 +601,85 @@ def override_insert(cur, args):
     print(f"Toutes les données du réseau {args.network} vont êtres ecrasées.")
     print("Suppression...")
     clear_tables(cur, args.network)
-    return get_all_files(args.xtr_files, gziped=args.gziped)
+    return get_all_files(args.xtr_files, gziped=args.gziped, manifest_dir=get_manifest_dir(args))
 
 
-def strict_insert(cur, args):
+def get_inserted_files(cur, network):
     """
-    Prépare pour une insertion en se basant sur les fichiers déjà insérés.
-    Renvoie la liste de tout les fichiers qui ne sont pas déjà insérés.
+    Renvoie les noms des fichiers déjà insérés d'un réseau, par station.
     """
-    print("Récupération des fichiers insérés dans la base de données...")
     cur.execute(
         """--sql
-        select i.name as name
+        select s.fullname as station, i.name as name
         from inserted_file i
         inner join station s on s.id = i.station_id
         inner join network n on n.id = s.network_id
         where n.name = %s;
         """,
-        (args.network,),
+        (network,),
     )
-    res = cur.fetchall()
 
-    blacklisted_files = [r["name"] for r in res]
-    print(f"{len(blacklisted_files)} fichiers déjà inserés trouvés.")
+    inserted_files = defaultdict(set)
+    for r in cur:
+        inserted_files[r["station"]].add(r["name"])
 
-    return get_all_files(args.xtr_files, blacklisted_files, gziped=args.gziped)
+    return inserted_files
 
 
-def xtr_import(args, db_connection):
+def strict_insert(cur, args):
+    """
+    Prépare pour une insertion en se basant sur les fichiers déjà insérés.
+    Renvoie la liste de tout les fichiers qui ne sont pas déjà insérés.
+
+    Avec `args.newer_only`, seuls les fichiers plus récents que le dernier fichier
+    inséré de chaque station sont gardés : seul ce dernier fichier est alors récupéré.
+    """
+    if args.newer_only:
+        print("Récupération du dernier fichier inséré de chaque station...")
+        cur.execute(
+            """--sql
+            select s.fullname as station, max(i.name) as name
+            from inserted_file i
+            inner join station s on s.id = i.station_id
+            inner join network n on n.id = s.network_id
+            where n.name = %s
+            group by s.fullname;
+            """,
+            (args.network,),
+        )
+        watermarks = {r["station"]: r["name"] for r in cur}
+        print(f"{len(watermarks)} stations déjà insérées trouvées.")
+
+        return get_all_files(
+            args.xtr_files, gziped=args.gziped, watermarks=watermarks, manifest_dir=get_manifest_dir(args)
+        )
+
+    print("Récupération des fichiers insérés dans la base de données...")
+    blacklisted_files = get_inserted_files(cur, args.network)
+    print(f"{sum(map(len, blacklisted_files.values()))} fichiers déjà inserés trouvés.")
+
+    return get_all_files(args.xtr_files, blacklisted_files, gziped=args.gziped, manifest_dir=get_manifest_dir(args))
+
+
+def xtr_import(args, db_connection, async_pool=None):
+    """
+    Importe les fichiers xtr. `async_pool` crée le pool de connexions asynchrones
+    utilisé avec `--async`.
+    """
     with db_connection() as conn:
         with conn.cursor() as cur:
+            # Les IDs déjà existants sont récupérés une fois pour toute l'importation
+            DatabaseFetcher().preload(cur)
+
             if args.override:
                 all_files = override_insert(cur, args)
 
             else:
                 all_files = strict_insert(cur, args)
 
+            for month in ensure_partitions(cur, [f.name.split(".", 1)[0] for f in all_files]):
+                print("Création de la partition", partition_name(month))
+
     nb_files = len(all_files)
     print(nb_files, "nouveaux fichiers vont être traitées.")
 
@@ -281,9 +691,37 @@ def xtr_import(args, db_connection):
     for key, group in groupby(all_files, get_xtr_station_id):
         stations.append((key, list(str(f.resolve()) for f in group)))  # type: ignore
 
-    if args.parallel:
-        process_parallel(db_connection, stations, args.network, args.gziped)
+    cache = ParseCache(args.cache_dir, args.cache_max_size) if args.cache else None
+
+    if args.use_async:
+        errors = process_async(
+            db_connection,
+            async_pool,
+            stations,
+            args.network,
+            args.workers,
+            args.writers,
+            args.batch_size,
+            args.metrics,
+            cache,
+        )
+        report_errors(errors)
+    elif args.parallel:
+        errors = process_parallel(
+            db_connection,
+            stations,
+            args.network,
+            args.workers,
+            args.writers,
+            args.batch_size,
+            args.metrics,
+            cache,
+        )
+        report_errors(errors)
     else:
-        process_sequencial(db_connection, stations, args.network, args.gziped)
+        process_sequencial(db_connection, stations, args.network, args.batch_size, args.metrics, cache)
+
+    if cache is not None:
+        cache.prune()
 
     print("OK !")